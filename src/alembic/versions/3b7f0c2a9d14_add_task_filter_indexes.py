@@ -0,0 +1,56 @@
+"""add task filter indexes
+
+Revision ID: 3b7f0c2a9d14
+Revises: 8c1d63d42363
+Create Date: 2026-10-18 10:04:52.611379
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7f0c2a9d14"
+down_revision: Union[str, Sequence[str], None] = "8c1d63d42363"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+OPEN_TASKS = sa.text("status <> 'done'")
+
+INDEXES = [
+    ("ix_tasks_user_id_status_id", "tasks", ["user_id", "status", "id"], None),
+    ("ix_tasks_project_id_status_id", "tasks", ["project_id", "status", "id"], None),
+    ("ix_tasks_user_id_deadline_open", "tasks", ["user_id", "deadline"], OPEN_TASKS),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=where,
+                sqlite_where=where,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
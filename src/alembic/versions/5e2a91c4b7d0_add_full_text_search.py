@@ -0,0 +1,63 @@
+"""add full text search
+
+Revision ID: 5e2a91c4b7d0
+Revises: 3b7f0c2a9d14
+Create Date: 2026-10-18 10:41:27.094518
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# the DDL is shared with the create_all hook of the search service, see there
+from src.services.search import (
+    POSTGRES_DROP_SEARCH_COLUMNS_DDL,
+    POSTGRES_SEARCH_COLUMNS_DDL,
+    SQLITE_DROP_SEARCH_DDL,
+    SQLITE_SEARCH_DDL,
+    postgres_drop_search_index_ddl,
+    postgres_search_index_ddl,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e2a91c4b7d0"
+down_revision: Union[str, Sequence[str], None] = "3b7f0c2a9d14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade_postgresql() -> None:
+    for statement in POSTGRES_SEARCH_COLUMNS_DDL:
+        op.execute(statement)
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for statement in postgres_search_index_ddl(concurrently=True):
+            op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        upgrade_postgresql()
+    elif dialect == "sqlite":
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            for statement in postgres_drop_search_index_ddl(concurrently=True):
+                op.execute(statement)
+        for statement in POSTGRES_DROP_SEARCH_COLUMNS_DDL:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for statement in SQLITE_DROP_SEARCH_DDL:
+            op.execute(statement)
@@ -0,0 +1,53 @@
+"""add foreign key access indexes
+
+Revision ID: 8c1d63d42363
+Revises: f8e59e5ec076
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c1d63d42363"
+down_revision: Union[str, Sequence[str], None] = "f8e59e5ec076"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_projects_user_id_id", "projects", ["user_id", "id"]),
+    ("ix_tasks_user_id_id", "tasks", ["user_id", "id"]),
+    ("ix_tasks_project_id_id", "tasks", ["project_id", "id"]),
+    ("ix_comments_task_id_user_id_id", "comments", ["task_id", "user_id", "id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
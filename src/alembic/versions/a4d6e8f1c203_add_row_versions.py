@@ -0,0 +1,54 @@
+"""add row versions
+
+Revision ID: a4d6e8f1c203
+Revises: 5e2a91c4b7d0
+Create Date: 2026-10-18 11:22:08.530761
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4d6e8f1c203"
+down_revision: Union[str, Sequence[str], None] = "5e2a91c4b7d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ["projects", "tasks", "comments"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    for table in TABLES:
+        # sqlite only adds columns with a constant default, the rows are stamped after
+        updated_at_default = (
+            sa.text("'1970-01-01 00:00:00'") if sqlite else sa.func.now()
+        )
+        op.add_column(
+            table,
+            sa.Column(
+                "updated_at",
+                sa.DateTime(),
+                nullable=False,
+                server_default=updated_at_default,
+            ),
+        )
+        op.add_column(
+            table,
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+        )
+        if sqlite:
+            op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        op.drop_column(table, "version")
+        op.drop_column(table, "updated_at")
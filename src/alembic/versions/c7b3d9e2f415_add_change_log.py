@@ -0,0 +1,68 @@
+"""add change log
+
+Revision ID: c7b3d9e2f415
+Revises: a4d6e8f1c203
+Create Date: 2026-10-18 12:04:51.218374
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# the triggers are shared with the create_all hook of the sync service, see there
+from src.services.sync import (
+    POSTGRES_DROP_SYNC_DDL,
+    POSTGRES_SYNC_DDL,
+    SQLITE_DROP_SYNC_DDL,
+    SQLITE_SYNC_DDL,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7b3d9e2f415"
+down_revision: Union[str, Sequence[str], None] = "a4d6e8f1c203"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "changes",
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            primary_key=True,
+        ),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("entity", sa.String(length=20), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("txid", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column(
+            "changed_at", sa.DateTime(), nullable=False, server_default=sa.func.now()
+        ),
+    )
+    op.create_index("ix_changes_user_id_txid_id", "changes", ["user_id", "txid", "id"])
+    op.create_index("ix_changes_changed_at", "changes", ["changed_at"])
+
+    dialect = op.get_bind().dialect.name
+    triggers = {"postgresql": POSTGRES_SYNC_DDL, "sqlite": SQLITE_SYNC_DDL}
+    for statement in triggers.get(dialect, []):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    drop_triggers = {
+        "postgresql": POSTGRES_DROP_SYNC_DDL,
+        "sqlite": SQLITE_DROP_SYNC_DDL,
+    }
+    for statement in drop_triggers.get(dialect, []):
+        op.execute(statement)
+
+    op.drop_index("ix_changes_changed_at", table_name="changes")
+    op.drop_index("ix_changes_user_id_txid_id", table_name="changes")
+    op.drop_table("changes")
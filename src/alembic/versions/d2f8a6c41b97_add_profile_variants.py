@@ -0,0 +1,29 @@
+"""add profile variants
+
+Revision ID: d2f8a6c41b97
+Revises: c7b3d9e2f415
+Create Date: 2026-10-18 12:47:13.604129
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f8a6c41b97"
+down_revision: Union[str, Sequence[str], None] = "c7b3d9e2f415"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("profile_variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "profile_variants")
@@ -0,0 +1,116 @@
+"""create base tables
+
+Revision ID: f8e59e5ec076
+Revises:
+Create Date: 2026-10-18 08:47:05.902113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "f8e59e5ec076"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+task_status = postgresql.ENUM(
+    "todo", "in_progress", "done", name="task_status", create_type=False
+)
+task_priority = postgresql.ENUM(
+    "low", "medium", "high", name="task_priority", create_type=False
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # databases created by Base.metadata.create_all already have these tables
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        task_status.create(bind, checkfirst=True)
+        task_priority.create(bind, checkfirst=True)
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(length=50), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("hashed_password", sa.String(length=255), nullable=True),
+        sa.Column("profile_image", sa.String(length=255), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("last_login", sa.DateTime(), nullable=True),
+        sa.Column("role", sa.String(length=50), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("email"),
+        sa.UniqueConstraint("username"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_users_id", "users", ["id"], if_not_exists=True)
+
+    op.create_table(
+        "projects",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(length=255), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["users.id"], ondelete="CASCADE", onupdate="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_projects_id", "projects", ["id"], if_not_exists=True)
+
+    op.create_table(
+        "tasks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(length=255), nullable=False),
+        sa.Column("status", task_status, nullable=True),
+        sa.Column("priority", task_priority, nullable=True),
+        sa.Column("deadline", sa.DateTime(), nullable=True),
+        sa.Column("project_id", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["users.id"], ondelete="CASCADE", onupdate="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_tasks_id", "tasks", ["id"], if_not_exists=True)
+
+    op.create_table(
+        "comments",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("content", sa.String(length=255), nullable=True),
+        sa.Column("task_id", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["task_id"], ["tasks.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_comments_id", "comments", ["id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_comments_id", table_name="comments")
+    op.drop_table("comments")
+    op.drop_index("ix_tasks_id", table_name="tasks")
+    op.drop_table("tasks")
+    op.drop_index("ix_projects_id", table_name="projects")
+    op.drop_table("projects")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
+
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        task_priority.drop(bind, checkfirst=True)
+        task_status.drop(bind, checkfirst=True)
@@ -1,13 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 import src.routes.auth.auth as auths
 import src.routes.comments.comments as comments
+import src.routes.events.events as events
+import src.routes.media.media as media
 import src.routes.projects.projects as projects
+import src.routes.search.search as search
+import src.routes.sync.sync as sync
 import src.routes.tasks.task as tasks
 import src.routes.users.users as users
+from src.services.cache import response_cache
+from src.services.events import board_events
+from src.services.images import image_processor
+from src.services.metrics import collect_metrics
 from src.services.services import *
+from src.services.sync import SYNC_PRUNE_INTERVAL, prune_changes_periodically
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_CREATE_ALL:
+        await init_db()
+    await board_events.start()
+    pruner = None
+    if SYNC_PRUNE_INTERVAL:
+        pruner = asyncio.create_task(prune_changes_periodically())
+    yield
+    if pruner is not None:
+        pruner.cancel()
+    await board_events.close()
+    image_processor.close()
+    await response_cache.close()
+    await engin.dispose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # using routes
 app.include_router(auths.route)
@@ -15,3 +45,13 @@ app.include_router(projects.route)
 app.include_router(tasks.route)
 app.include_router(comments.route)
 app.include_router(users.route)
+app.include_router(search.route)
+app.include_router(events.route)
+app.include_router(sync.route)
+app.include_router(media.route)
+
+
+# in-process pool and cache metrics
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return collect_metrics()
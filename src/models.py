@@ -1,9 +1,48 @@
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, String
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    func,
+    literal_column,
+    text,
+)
 from sqlalchemy.orm import relationship
 
 from src.database import Base
 
 
+# naive UTC, like every DateTime column of the schema
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# last change time and change counter of a row, behind the list ETags
+class RowVersion:
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        default=utc_now,
+        onupdate=utc_now,
+        server_default=func.now(),
+    )
+    version = Column(
+        Integer,
+        nullable=False,
+        default=1,
+        onupdate=literal_column("version + 1"),
+        server_default="1",
+    )
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -12,21 +51,36 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False)
     hashed_password = Column(String(255), nullable=True)
     profile_image = Column(String(255), nullable=True)
+    # {size: {format: path}} of the thumbnails of profile_image, once generated
+    profile_variants = Column(JSON, nullable=True)
     is_active = Column(Boolean, default=True, nullable=True)
     last_login = Column(DateTime, nullable=True)
     role = Column(String(50), nullable=True)
 
+    # children are removed by the ON DELETE CASCADE foreign keys, not loaded
     project = relationship(
-        "Project", back_populates="user", cascade="all, delete-orphan"
+        "Project",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     comment = relationship(
-        "Comment", back_populates="user", cascade="all, delete-orphan"
+        "Comment",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    task = relationship(
+        "Task",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
-    task = relationship("Task", back_populates="user", cascade="all, delete-orphan")
 
 
-class Project(Base):
+class Project(RowVersion, Base):
     __tablename__ = "projects"
+    __table_args__ = (Index("ix_projects_user_id_id", "user_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -36,11 +90,30 @@ class Project(Base):
     )
 
     user = relationship("User", back_populates="project")
-    task = relationship("Task", back_populates="project", cascade="all, delete-orphan")
+    task = relationship(
+        "Task",
+        back_populates="project",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
-class Task(Base):
+class Task(RowVersion, Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+        Index("ix_tasks_project_id_id", "project_id", "id"),
+        Index("ix_tasks_user_id_status_id", "user_id", "status", "id"),
+        Index("ix_tasks_project_id_status_id", "project_id", "status", "id"),
+        # open tasks by deadline, for the overdue board
+        Index(
+            "ix_tasks_user_id_deadline_open",
+            "user_id",
+            "deadline",
+            postgresql_where=text("status <> 'done'"),
+            sqlite_where=text("status <> 'done'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
@@ -61,13 +134,19 @@ class Task(Base):
 
     project = relationship("Project", back_populates="task")
     comment = relationship(
-        "Comment", back_populates="task", cascade="all, delete-orphan"
+        "Comment",
+        back_populates="task",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     user = relationship("User", back_populates="task")
 
 
-class Comment(Base):
+class Comment(RowVersion, Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_task_id_user_id_id", "task_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String(255), nullable=True)
@@ -76,3 +155,21 @@ class Comment(Base):
 
     task = relationship("Task", back_populates="comment")
     user = relationship("User", back_populates="comment")
+
+
+# one row per written project, task or comment, for each owner of a project it
+# was on; filled by the database triggers of src/services/sync.py, read by /sync
+class Change(Base):
+    __tablename__ = "changes"
+    __table_args__ = (
+        Index("ix_changes_user_id_txid_id", "user_id", "txid", "id"),
+        Index("ix_changes_changed_at", "changed_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    # writing transaction on postgres, where ids are not allocated in commit order
+    txid = Column(BigInteger, nullable=False, server_default="0")
+    changed_at = Column(DateTime, nullable=False, server_default=func.now())
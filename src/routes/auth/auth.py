@@ -1,14 +1,17 @@
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Optional
 
-from decouple import config
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt
-from passlib.context import CryptContext
+from pydantic import computed_field
+from sqlalchemy import select
 
 from src.models import User
+from src.services.passwords import password_hasher
 from src.services.services import *
+from src.services.storage import media_url
+from src.services.tokens import jwt_settings, token_cache
 
 route = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -20,24 +23,58 @@ class UserRequest(BaseModel):
     # profile_image: UploadFile = File(...)
 
 
+# public view of a user, never exposes the password hash
+class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    email: str
+    profile_image: Optional[str] = None
+    profile_variants: Optional[dict[str, dict[str, str]]] = None
+    is_active: Optional[bool] = None
+    last_login: Optional[datetime] = None
+    role: Optional[str] = None
+
+    # immutable GET /media urls of the profile image and of its thumbnails
+    @computed_field
+    @property
+    def profile_image_url(self) -> Optional[str]:
+        return media_url(self.profile_image)
+
+    @computed_field
+    @property
+    def profile_variant_urls(self) -> Optional[dict[str, dict[str, str]]]:
+        if not self.profile_variants:
+            return None
+        return {
+            size: {name: media_url(path) for name, path in formats.items()}
+            for size, formats in self.profile_variants.items()
+        }
+
+
+class LoginResponse(BaseModel):
+    user: UserResponse
+    access_token: str
+    refresh_token: str
+
+
 # config the jwt
 # secrete_key = secrets.token_urlsafe(64)
 # ALGORITHM = "HS256"
 # SECRET_KEY = secrete_key
 
-# config to hash password
-bcrypt_contex = CryptContext(["argon2", "bcrypt"], deprecated="auto")
-
 # where to send request went we want to authenticate user
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 # authenticate the user
-def authenticateUser(db, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticateUser(db, username: str, password: str):
+    result = await db.execute(select(User).filter(User.username == username))
+    user = result.scalars().first()
     if not user:
         return False
-    if not bcrypt_contex.verify(password, str(user.hashed_password)):
+    if not await password_hasher.verify(password, str(user.hashed_password)):
         return False
     return user
 
@@ -48,7 +85,7 @@ async def getAccessToken(username: str, id: int, expire_minutes: int):
     expired_time = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
     payload.update({"exp": expired_time})
     access_token = jwt.encode(
-        claims=payload, key=config("SECRETE_KEY"), algorithm=config("ALGORITHME")  # type: ignore
+        claims=payload, key=jwt_settings.secret_key, algorithm=jwt_settings.algorithm
     )
     return access_token
 
@@ -59,7 +96,7 @@ async def getRefreshToken(username: str, id: int, expire_days: int = 7):
     expired_days = datetime.now(timezone.utc) + timedelta(minutes=expire_days)
     payload.update({"exp": expired_days})
     access_token = jwt.encode(
-        claims=payload, key=config("SECRETE_KEY"), algorithm=config("ALGORITHME")  # type: ignore
+        claims=payload, key=jwt_settings.secret_key, algorithm=jwt_settings.algorithm
     )
     return access_token
 
@@ -67,9 +104,14 @@ async def getRefreshToken(username: str, id: int, expire_days: int = 7):
 # authenticate the current user
 def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
     try:
-        payload = jwt.decode(
-            token=token, key=config("SECRETE_KEY"), algorithms=config("ALGORITHME")  # type: ignore
-        )
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(
+                token=token,
+                key=jwt_settings.secret_key,
+                algorithms=jwt_settings.algorithm,
+            )
+            token_cache.set(token, payload)
         if payload["scope"] == "access_token":
             username = payload["sub"]
             user_id = payload["id"]
@@ -84,26 +126,29 @@ def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
 
 
 # register the user
-@route.post("/register-user/", status_code=status.HTTP_201_CREATED)
+@route.post(
+    "/register-user/", status_code=status.HTTP_201_CREATED, response_model=UserResponse
+)
 async def createUser(data: UserRequest, db: db_dependency):
     user = User(
         username=data.username,
         email=data.email,
-        hashed_password=bcrypt_contex.hash(data.password),
+        hashed_password=await password_hasher.hash(data.password),
     )
 
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return user
 
 
 # login user
-@route.post("/login-user", status_code=status.HTTP_202_ACCEPTED)
+@route.post(
+    "/login-user", status_code=status.HTTP_202_ACCEPTED, response_model=LoginResponse
+)
 async def loginUser(
     db: db_dependency, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ):
-    user = authenticateUser(db, form_data.username, form_data.password)
+    user = await authenticateUser(db, form_data.username, form_data.password)
     if user is not None:
         accessToken = await getAccessToken(form_data.username, user.id, 30)  # type: ignore
         refreshToken = await getRefreshToken(form_data.username, user.id)  # type: ignore
@@ -1,13 +1,24 @@
 import traceback
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from sqlalchemy import insert, literal, select, update
 
-from src.models import Comment
+from src.models import Comment, Task
 from src.routes.auth.auth import get_current_user
+from src.services.cache import TASKS, response_cache
+from src.services.etag import (
+    list_etag,
+    not_modified,
+    not_modified_response,
+    row_versions,
+)
+from src.services.events import board_events
+from src.services.pagination import Page, PageParams, paginate
 from src.services.services import *
 
 user_dependency = Annotated[dict, Depends(get_current_user)]
+page_dependency = Annotated[PageParams, Depends()]
 route = APIRouter(prefix="/comment", tags=["comments"])
 
 
@@ -20,29 +31,85 @@ class CommentUpdate(BaseModel):
     content: Optional[str] = None
 
 
+class CommentResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    content: Optional[str] = None
+    task_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+
+comment_columns = response_columns(Comment, CommentResponse)
+
+
+# owner and project of the comment's task, returned by the write itself;
+# task_id is the comments column (correlated) or the id being inserted
+def comment_board_columns(task_id):
+    return [
+        select(Task.user_id)
+        .where(Task.id == task_id)
+        .scalar_subquery()
+        .label("task_owner_id"),
+        select(Task.project_id)
+        .where(Task.id == task_id)
+        .scalar_subquery()
+        .label("project_id"),
+    ]
+
+
+# comments show up in the task lists of the task owner (?include=comments)
+# and on the board of the task's project
+async def comment_changed(comment, type: str):
+    await response_cache.invalidate(comment.task_owner_id, TASKS)
+    data = CommentResponse.model_validate(comment).model_dump(mode="json")
+    await board_events.publish(comment.project_id, type, data)
+
+
 # Get all user task comments
-@route.get("/{task_id}", status_code=status.HTTP_200_OK)
+@route.get(
+    "/{task_id}", status_code=status.HTTP_200_OK, response_model=Page[CommentResponse]
+)
 async def get_all_task_comment(
-    db: db_dependency, user: user_dependency, task_id: int = Path(gt=0)
+    request: Request,
+    response: Response,
+    db: db_dependency,
+    user: user_dependency,
+    page: page_dependency,
+    task_id: int = Path(gt=0),
 ):
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
-        comments = (
-            db.query(Comment).filter_by(user_id=user.get("id"), task_id=task_id).all()
+
+        conditions = (Comment.user_id == user.get("id"), Comment.task_id == task_id)
+        etag = await list_etag(
+            db, request, user.get("id"), row_versions(Comment, *conditions)
         )
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+
+        query = select(*comment_columns).where(*conditions)
+        comments = await paginate(db, query, page, Comment.id)
 
         return comments
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_all_task_comment :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Create Comment by log user
-@route.post("/creat-comment/", status_code=status.HTTP_201_CREATED)
+@route.post(
+    "/creat-comment/",
+    status_code=status.HTTP_201_CREATED,
+    response_model=CommentResponse,
+)
 async def create_comment(
     db: db_dependency, user: user_dependency, data: CommentRequest
 ):
@@ -50,22 +117,40 @@ async def create_comment(
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        comment = Comment(**data.model_dump(), user_id=user.get("id"))
+        # INSERT ... SELECT: no row when the task does not exist
+        result = await db.execute(
+            insert(Comment)
+            .from_select(
+                ["content", "task_id", "user_id"],
+                select(literal(data.content), Task.id, literal(user.get("id"))).where(
+                    Task.id == data.task_id
+                ),
+            )
+            .returning(*comment_columns, *comment_board_columns(data.task_id))
+        )
+        comment = result.first()
+        if comment is None:
+            raise HTTPException(status_code=404, detail="Task not found")
 
-        db.add(comment)
-        db.commit()
-        db.refresh(comment)
+        await db.commit()
+        await comment_changed(comment, "comment.created")
 
         return comment
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR create_comment :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Edit comment by user
-@route.put("/edit-comment/{comment_id}", status_code=status.HTTP_200_OK)
+@route.put(
+    "/edit-comment/{comment_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=CommentResponse,
+)
 async def edit_comment(
     db: db_dependency,
     user: user_dependency,
@@ -76,21 +161,27 @@ async def edit_comment(
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        edit_comment = db.query(Comment).filter_by(id=comment_id).first()
-        print(edit_comment)
+        new_data = data.model_dump()
+        result = await db.execute(
+            update(Comment)
+            .where(Comment.id == comment_id, Comment.user_id == user.get("id"))
+            .values(content=new_data.get("content"))
+            .returning(*comment_columns, *comment_board_columns(Comment.task_id))
+            .execution_options(synchronize_session=False)
+        )
+        edit_comment = result.first()
         if edit_comment is None:
             raise HTTPException(status_code=404, detail="Comment not found")
 
-        new_data = data.model_dump()
-        setattr(edit_comment, "content", new_data.get("content"))
-
-        db.commit()
-        db.refresh(edit_comment)
+        await db.commit()
+        await comment_changed(edit_comment, "comment.updated")
 
         return edit_comment
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR edit_comment :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketException, status
+from fastapi.security.utils import get_authorization_scheme_param
+from sqlalchemy import select
+
+from src.models import Project
+from src.routes.auth.auth import get_current_user
+from src.services.events import Subscription, board_events
+from src.services.services import *
+
+route = APIRouter(prefix="/ws", tags=["events"])
+
+
+# the bearer token of the socket, browsers can only send it in the query string
+def socket_user(websocket: WebSocket, token: Optional[str]) -> dict:
+    scheme, credentials = get_authorization_scheme_param(
+        websocket.headers.get("authorization")
+    )
+    if scheme.lower() == "bearer":
+        token = credentials
+    if not token:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated"
+        )
+    try:
+        return get_current_user(token)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+
+
+# forward the project events until the client falls too far behind
+async def send_events(websocket: WebSocket, subscription: Subscription):
+    while True:
+        message = await subscription.queue.get()
+        if subscription.overflowed:
+            await websocket.close(
+                code=status.WS_1013_TRY_AGAIN_LATER, reason="Too many events missed"
+            )
+            return
+        await websocket.send_text(message)
+
+
+# the client sends nothing, reading only tells when it is gone
+async def wait_disconnect(websocket: WebSocket):
+    async for _ in websocket.iter_text():
+        pass
+
+
+# Follow the task and comment changes of a project board
+@route.websocket("/project/{project_id}")
+async def project_events(
+    websocket: WebSocket,
+    db: db_dependency,
+    project_id: int = Path(gt=0),
+    token: Optional[str] = None,
+):
+    user = socket_user(websocket, token)
+
+    result = await db.execute(
+        select(Project.id).filter_by(user_id=user.get("id"), id=project_id)
+    )
+    project = result.first()
+    # the socket stays open for long, it must not hold a pooled connection
+    await db.close()
+    if project is None:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Project not found"
+        )
+
+    await websocket.accept()
+    subscription = board_events.subscribe(project_id)
+    tasks = [
+        asyncio.create_task(send_events(websocket, subscription)),
+        asyncio.create_task(wait_disconnect(websocket)),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        board_events.unsubscribe(subscription)
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from src.services.etag import not_modified
+from src.services.storage import media_path
+
+route = APIRouter(prefix="/media", tags=["media"])
+
+# the names are content hashes, a url always serves the same bytes
+IMMUTABLE_HEADERS = {
+    "Cache-Control": "public, max-age=31536000, immutable",
+    "X-Content-Type-Options": "nosniff",
+}
+
+
+# Serve a stored file, sent by the server from the file itself (sendfile when
+# it supports it) with Range requests handled by FileResponse
+@route.get("/{file_path:path}", status_code=status.HTTP_200_OK)
+async def get_media(request: Request, file_path: str):
+    path = await run_in_threadpool(media_path, file_path)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = f'"{path.name}"'
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, **IMMUTABLE_HEADERS})
+    return FileResponse(path, headers={"ETag": etag, **IMMUTABLE_HEADERS})
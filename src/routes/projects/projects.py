@@ -1,12 +1,53 @@
 import traceback
-
-from fastapi import APIRouter, HTTPException, status
-
-from src.models import Project, Task
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    File,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from pydantic import ValidationError
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import selectinload
+
+from src.models import Project, Task, utc_now
 from src.routes.auth.auth import get_current_user
+from src.routes.tasks.task import (
+    SortDirection,
+    TaskDetail,
+    TaskFilters,
+    TaskOrder,
+    TaskPriority,
+    TaskRequest,
+    TaskStatus,
+    naive_utc,
+    task_detail,
+    task_export_query,
+    task_export_response,
+    task_list_query,
+    task_list_versions,
+    task_sort_key,
+)
+from src.services.cache import PROJECTS, TASKS, cached_json, response_cache
+from src.services.etag import (
+    list_etag,
+    not_modified,
+    not_modified_response,
+    row_versions,
+)
+from src.services.events import board_events
+from src.services.export import ExportFormat
+from src.services.imports import IMPORT_MAX_ERRORS, copy_rows, iter_batches
+from src.services.pagination import Page, PageParams, paginate
 from src.services.services import *
 
 user_dependency = Annotated[dict, Depends(get_current_user)]
+page_dependency = Annotated[PageParams, Depends()]
 route = APIRouter(prefix="/project", tags=["projects"])
 
 
@@ -16,49 +57,199 @@ class ProjectRequest(BaseModel):
     description: str = "Application web pour site de vente"
 
 
+class ProjectResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    description: str
+    user_id: Optional[int] = None
+
+
+project_columns = response_columns(Project, ProjectResponse)
+
+
+# a project with its tasks (and their comments) when asked for with ?include=
+class ProjectDetail(ProjectResponse):
+    tasks: Optional[list[TaskDetail]] = None
+
+
+class ProjectStats(BaseModel):
+    project_id: int
+    total: int
+    status: dict[TaskStatus, int]
+    priority: dict[TaskPriority, int]
+    overdue: int
+    next_deadline: Optional[datetime] = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+
+
+# task columns written by an import, in COPY order
+import_columns = [
+    "title",
+    "description",
+    "status",
+    "priority",
+    "deadline",
+    "project_id",
+    "user_id",
+    # COPY skips the python side column defaults
+    "updated_at",
+]
+
+
+# TaskRequest fields an imported record may set
+import_fields = ["title", "description", "status", "priority", "deadline"]
+
+
+def import_error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in detail['loc'])}: {detail['msg']}"
+            for detail in error.errors(include_url=False)
+        )
+    return str(error)
+
+
+# validate one imported record into a row of import_columns
+def import_row(record, project_id: int, user_id: int):
+    if isinstance(record, Exception):
+        raise ValueError(f"Invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object")
+
+    # csv.DictReader puts the cells past the header under the None key
+    if None in record:
+        headers = len(record) - 1
+        cells = headers + len(record[None])
+        raise ValueError(f"Too many columns: {cells} cells for {headers} headers")
+
+    # only the task fields are read, other columns (ids of an export) are
+    # ignored; empty csv cells fall back to the TaskRequest defaults
+    data = {
+        key: record[key] for key in import_fields if record.get(key) not in ("", None)
+    }
+    data["project_id"] = project_id
+    task = TaskRequest(**data)
+
+    return (
+        task.title,
+        task.description,
+        task.status.value,
+        task.priority.value,
+        task.deadline,
+        project_id,
+        user_id,
+        utc_now(),
+    )
+
+
 # Get all project
-@route.get("/", status_code=status.HTTP_200_OK)
-async def get_projects(db: db_dependency, user: user_dependency):
+@route.get("/", status_code=status.HTTP_200_OK, response_model=Page[ProjectResponse])
+async def get_projects(
+    request: Request, db: db_dependency, user: user_dependency, page: page_dependency
+):
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        projects = db.query(Project).filter(Project.user_id == user.get("id")).all()
+        condition = Project.user_id == user.get("id")
+        query = select(*project_columns).filter(condition)
 
-        return projects
+        async def etag():
+            versions = row_versions(Project, condition)
+            return await list_etag(db, request, user.get("id"), versions)
+
+        async def build():
+            projects = await paginate(db, query, page, Project.id)
+            return Page[ProjectResponse].model_validate(projects).model_dump_json()
+
+        return await cached_json(request, user.get("id"), PROJECTS, etag, build)
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_projects :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Get unique project
-@route.get("/{project_id}", status_code=status.HTTP_200_OK)
+@route.get(
+    "/{project_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=ProjectDetail,
+    response_model_exclude_unset=True,
+)
 async def get_unique_project(
-    db: db_dependency, user: user_dependency, project_id: int = Path(gt=0)
+    request: Request,
+    response: Response,
+    db: db_dependency,
+    user: user_dependency,
+    project_id: int = Path(gt=0),
+    include: Optional[str] = None,
 ):
+    include = parse_include(include, {"tasks", "comments"})
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        project = (
-            db.query(Project).filter_by(user_id=user.get("id"), id=project_id).first()
-        )
+        condition = (Project.user_id == user.get("id"), Project.id == project_id)
+        versions = [row_versions(Project, *condition)]
+        if include:
+            task_condition = (Task.project_id == Project.id, *condition)
+            versions += task_list_versions(include, *task_condition)
+        etag = await list_etag(db, request, user.get("id"), *versions)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+
+        if include:
+            # the whole board in three statements: project, tasks, comments
+            tasks = selectinload(Project.task)
+            if "comments" in include:
+                tasks = tasks.selectinload(Task.comment)
+            result = await db.execute(select(Project).where(*condition).options(tasks))
+            project = result.scalar_one_or_none()
+            if project is not None:
+                project = {
+                    **{
+                        name: getattr(project, name)
+                        for name in ProjectResponse.model_fields
+                    },
+                    "tasks": [task_detail(task, include) for task in project.task],
+                }
+        else:
+            result = await db.execute(select(*project_columns).where(*condition))
+            project = result.first()
 
         if project is None:
             raise HTTPException(status_code=404, detail="Project not found")
 
+        response.headers["ETag"] = etag
         return project
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_unique_project :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Create project
-@route.post("/create/", status_code=status.HTTP_201_CREATED)
+@route.post(
+    "/create/", status_code=status.HTTP_201_CREATED, response_model=ProjectResponse
+)
 async def create_project(
     db: db_dependency, user: user_dependency, data: ProjectRequest
 ):
@@ -71,19 +262,23 @@ async def create_project(
         )
 
         db.add(new_project)
-        db.commit()
-        db.refresh(new_project)
+        await db.commit()
+        await response_cache.invalidate(user.get("id"), PROJECTS)
 
         return new_project
     except Exception as e:
         print("ERREUR create_project :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # edit project
-@route.put("/edit-project/{project_id}", status_code=status.HTTP_200_OK)
+@route.put(
+    "/edit-project/{project_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=ProjectResponse,
+)
 async def edit_project(
     db: db_dependency,
     user: user_dependency,
@@ -94,29 +289,37 @@ async def edit_project(
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        project = (
-            db.query(Project).filter_by(user_id=user.get("id"), id=project_id).first()
+        result = await db.execute(
+            update(Project)
+            .where(Project.id == project_id, Project.user_id == user.get("id"))
+            .values(name=data.name, description=data.description)
+            .returning(*project_columns)
+            .execution_options(synchronize_session=False)
         )
+        project = result.first()
 
         if project is None:
             raise HTTPException(status_code=404, detail="Project not found")
 
-        setattr(project, "name", data.name)
-        setattr(project, "description", data.description)
-
-        db.commit()
-        db.refresh(project)
+        await db.commit()
+        await response_cache.invalidate(user.get("id"), PROJECTS)
 
         return project
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR edit_project :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Delete project
-@route.delete("/delete-project/{project_id}", status_code=status.HTTP_200_OK)
+@route.delete(
+    "/delete-project/{project_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=ProjectResponse,
+)
 async def delete_project(
     db: db_dependency, user: user_dependency, project_id: int = Path(gt=0)
 ):
@@ -124,74 +327,314 @@ async def delete_project(
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        project = (
-            db.query(Project).filter_by(id=project_id, user_id=user.get("id")).first()
+        # owners of the tasks that go with the project
+        result = await db.execute(
+            select(Task.user_id).where(Task.project_id == project_id).distinct()
+        )
+        task_owners = set(result.scalars().all())
+
+        # tasks and comments go with it through the ON DELETE CASCADE foreign keys
+        result = await db.execute(
+            delete(Project)
+            .where(Project.id == project_id, Project.user_id == user.get("id"))
+            .returning(*project_columns)
+            .execution_options(synchronize_session=False)
         )
+        project = result.first()
 
         if project is None:
             raise HTTPException(status_code=404, detail="Project not found")
 
-        db.delete(project)
-        db.commit()
+        await db.commit()
+        await response_cache.invalidate(user.get("id"), PROJECTS, TASKS)
+        for user_id in task_owners:
+            await response_cache.invalidate(user_id, TASKS)
+        await board_events.publish(project.id, "project.deleted")
 
         return project
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR delete_project :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 # Get all projects for connected user
-@route.get("/user/", status_code=status.HTTP_200_OK)
-async def get_user_projects(db: db_dependency, user: user_dependency):
+@route.get(
+    "/user/", status_code=status.HTTP_200_OK, response_model=Page[ProjectResponse]
+)
+async def get_user_projects(
+    request: Request,
+    response: Response,
+    db: db_dependency,
+    user: user_dependency,
+    page: page_dependency,
+):
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        projects = db.query(Project).filter(Project.user_id == user.get("id")).all()
+        condition = Project.user_id == user.get("id")
+        etag = await list_etag(
+            db, request, user.get("id"), row_versions(Project, condition)
+        )
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+
+        query = select(*project_columns).filter(condition)
+        projects = await paginate(db, query, page, Project.id)
 
         return projects
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_all_user_project :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Get all projects for any user
-@route.get("/user/{user_id}", status_code=status.HTTP_200_OK)
+@route.get(
+    "/user/{user_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ProjectResponse],
+)
 async def get_any_user_projects(
-    db: db_dependency, user: user_dependency, user_id: int = Path(gt=0)
+    request: Request,
+    response: Response,
+    db: db_dependency,
+    user: user_dependency,
+    user_id: int = Path(gt=0),
 ):
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        projects = db.query(Project).filter(Project.user_id == user_id).all()
+        condition = Project.user_id == user_id
+        etag = await list_etag(
+            db, request, user.get("id"), row_versions(Project, condition)
+        )
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+
+        result = await db.execute(select(*project_columns).filter(condition))
+        projects = result.all()
         return projects
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_any_user_projects :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Get all projects tasks
-@route.get("/{project_id}/tasks", status_code=status.HTTP_200_OK)
+@route.get(
+    "/{project_id}/tasks",
+    status_code=status.HTTP_200_OK,
+    response_model=Page[TaskDetail],
+    response_model_exclude_unset=True,
+)
 async def get_user_projects_tasks(
-    db: db_dependency, user: user_dependency, project_id: int = Path(gt=0)
+    request: Request,
+    response: Response,
+    db: db_dependency,
+    user: user_dependency,
+    page: page_dependency,
+    filters: Annotated[TaskFilters, Depends()],
+    project_id: int = Path(gt=0),
+    order_by: TaskOrder = TaskOrder.ID,
+    direction: SortDirection = SortDirection.ASC,
+    include: Optional[str] = None,
 ):
+    include = parse_include(include, {"comments"})
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        tasks = db.query(Task).filter(Task.project_id == project_id).all()
+        conditions = (Task.project_id == project_id, *filters.conditions())
+        versions = task_list_versions(include, *conditions)
+        etag = await list_etag(db, request, user.get("id"), *versions)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+
+        query = task_list_query(include, *conditions)
+        tasks = await paginate(
+            db,
+            query,
+            page,
+            Task.id,
+            task_sort_key(order_by),
+            direction == SortDirection.DESC,
+        )
+        if include:
+            tasks["items"] = [task_detail(task, include) for task in tasks["items"]]
         return tasks
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_all_project_task :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# aggregates of a project dashboard, computed in one pass over its tasks
+def project_stats_columns(now: datetime):
+    task_count = func.count(Task.id)
+    open_task = Task.status != TaskStatus.DONE.value
+    return [
+        task_count.label("total"),
+        *[
+            task_count.filter(Task.status == value.value).label(f"status_{value.value}")
+            for value in TaskStatus
+        ],
+        *[
+            task_count.filter(Task.priority == value.value).label(
+                f"priority_{value.value}"
+            )
+            for value in TaskPriority
+        ],
+        task_count.filter(open_task, Task.deadline < now).label("overdue"),
+        func.min(Task.deadline)
+        .filter(open_task, Task.deadline >= now)
+        .label("next_deadline"),
+    ]
+
+
+# Get the task counts of a project dashboard
+@route.get(
+    "/{project_id}/stats", status_code=status.HTTP_200_OK, response_model=ProjectStats
+)
+async def get_project_stats(
+    db: db_dependency, user: user_dependency, project_id: int = Path(gt=0)
+):
+    try:
+        if user is None:
+            raise HTTPException(status_code=401, detail="Authentication Failed")
+
+        # grouped by project so a missing or foreign project returns no row
+        now = naive_utc(datetime.now(timezone.utc))
+        result = await db.execute(
+            select(*project_stats_columns(now))
+            .select_from(Project)
+            .outerjoin(Task, Task.project_id == Project.id)
+            .where(Project.id == project_id, Project.user_id == user.get("id"))
+            .group_by(Project.id)
+        )
+        stats = result.first()
+        if stats is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+
+        row = stats._mapping
+        return {
+            "project_id": project_id,
+            "total": row["total"],
+            "status": {value: row[f"status_{value.value}"] for value in TaskStatus},
+            "priority": {
+                value: row[f"priority_{value.value}"] for value in TaskPriority
+            },
+            "overdue": row["overdue"],
+            "next_deadline": row["next_deadline"],
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("ERREUR get_project_stats :", e)
+        traceback.print_exc()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Export all project tasks with their comments
+@route.get("/{project_id}/export", status_code=status.HTTP_200_OK)
+async def export_project_tasks(
+    db: db_dependency,
+    user: user_dependency,
+    project_id: int = Path(gt=0),
+    format: ExportFormat = ExportFormat.NDJSON,
+):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    result = await db.execute(
+        select(Project.id).filter_by(user_id=user.get("id"), id=project_id)
+    )
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    query = task_export_query(Task.project_id == project_id)
+    return task_export_response(db, query, format, f"project-{project_id}")
+
+
+# Import tasks into a project from a csv or ndjson file
+@route.post(
+    "/{project_id}/import",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ImportResult,
+)
+async def import_project_tasks(
+    db: db_dependency,
+    user: user_dependency,
+    file: UploadFile = File(...),
+    project_id: int = Path(gt=0),
+    format: Optional[ExportFormat] = None,
+):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    result = await db.execute(
+        select(Project.id).filter_by(user_id=user.get("id"), id=project_id)
+    )
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if format is None:
+        is_csv = (file.filename or "").lower().endswith(".csv")
+        format = ExportFormat.CSV if is_csv else ExportFormat.NDJSON
+
+    try:
+        imported = 0
+        failed = 0
+        errors = []
+        async for batch in iter_batches(file.file, format):
+            rows = []
+            for line, record in batch:
+                if isinstance(record, dict) and not any(record.values()):
+                    continue
+                try:
+                    rows.append(import_row(record, project_id, user.get("id")))
+                except (ValidationError, ValueError, TypeError) as e:
+                    failed += 1
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append({"line": line, "error": import_error_message(e)})
+            if rows:
+                await copy_rows(db, Task, import_columns, rows)
+                imported += len(rows)
+
+        await db.commit()
+        await response_cache.invalidate(user.get("id"), TASKS)
+        if imported:
+            # too many rows for an event, the boards reload the project tasks
+            await board_events.publish(
+                project_id, "tasks.imported", {"imported": imported}
+            )
+
+        return {"imported": imported, "failed": failed, "errors": errors}
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        print("ERREUR import_project_tasks :", e)
+        traceback.print_exc()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
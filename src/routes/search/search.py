@@ -0,0 +1,53 @@
+import traceback
+
+from fastapi import APIRouter, HTTPException, Query, status
+from sqlalchemy import select
+
+from src.models import Task
+from src.routes.auth.auth import get_current_user
+from src.routes.tasks.task import TaskResponse, task_columns
+from src.services.pagination import Page, PageParams, paginate
+from src.services.search import ranked_task_ids, search_terms
+from src.services.services import *
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+page_dependency = Annotated[PageParams, Depends()]
+route = APIRouter(prefix="/search", tags=["search"])
+
+
+class SearchResult(TaskResponse):
+    rank: float
+
+
+# Search the user tasks by title, description and comments
+@route.get("", status_code=status.HTTP_200_OK, response_model=Page[SearchResult])
+async def search_tasks(
+    db: db_dependency,
+    user: user_dependency,
+    page: page_dependency,
+    q: str = Query(min_length=1, max_length=200),
+):
+    try:
+        if user is None:
+            raise HTTPException(status_code=401, detail="Authentication Failed")
+
+        if not search_terms(q):
+            return {"items": [], "next_cursor": None}
+
+        ranked = ranked_task_ids(db.bind.dialect.name, q, user.get("id"))
+        query = (
+            select(*task_columns, ranked.c.rank)
+            .select_from(Task)
+            .join(ranked, ranked.c.task_id == Task.id)
+        )
+        results = await paginate(
+            db, query, page, Task.id, ranked.c.rank, descending=True
+        )
+        return results
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("ERREUR search_tasks :", e)
+        traceback.print_exc()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
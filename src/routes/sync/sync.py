@@ -0,0 +1,143 @@
+import traceback
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, status
+from sqlalchemy import func, select, tuple_
+
+from src.models import Change, Comment, Project, Task, utc_now
+from src.routes.auth.auth import get_current_user
+from src.routes.comments.comments import CommentResponse, comment_columns
+from src.routes.projects.projects import ProjectResponse, project_columns
+from src.routes.tasks.task import TaskResponse, task_columns
+from src.services.pagination import decode_cursor, encode_cursor
+from src.services.services import *
+from src.services.sync import SYNC_MAX_CHANGES, SYNC_RETENTION_DAYS, settled_txid
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+route = APIRouter(prefix="/sync", tags=["sync"])
+
+
+class SyncDeleted(BaseModel):
+    projects: list[int] = []
+    tasks: list[int] = []
+    comments: list[int] = []
+
+
+# rows changed since the token, deleting a project or a task also deletes
+# what it contains on the client
+class SyncResponse(BaseModel):
+    projects: list[ProjectResponse] = []
+    tasks: list[TaskResponse] = []
+    comments: list[CommentResponse] = []
+    deleted: SyncDeleted = SyncDeleted()
+    token: str
+    has_more: bool = False
+
+
+# log position (txid, change id) and issue time of a sync token
+def encode_sync_token(txid: int, change_id: int) -> str:
+    return encode_cursor([txid, change_id, utc_now()])
+
+
+def decode_sync_token(token: str):
+    values = decode_cursor(token)
+    if (
+        len(values) != 3
+        or not all(isinstance(value, int) for value in values[:2])
+        or not isinstance(values[2], datetime)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+# current rows of the changed ids still on one of the user's projects, the
+# other ids were deleted or moved away
+async def changed_rows(db, user_id: int, ids: dict[str, set[int]]):
+    queries = {
+        "projects": select(*project_columns).where(
+            Project.id.in_(ids["projects"]), Project.user_id == user_id
+        ),
+        "tasks": select(*task_columns)
+        .join(Project, Project.id == Task.project_id)
+        .where(Task.id.in_(ids["tasks"]), Project.user_id == user_id),
+        "comments": select(*comment_columns)
+        .join(Task, Task.id == Comment.task_id)
+        .join(Project, Project.id == Task.project_id)
+        .where(Comment.id.in_(ids["comments"]), Project.user_id == user_id),
+    }
+    rows = {name: [] for name in queries}
+    for name, query in queries.items():
+        if ids[name]:
+            rows[name] = (await db.execute(query)).all()
+    deleted = {
+        name: sorted(ids[name] - {row.id for row in rows[name]}) for name in queries
+    }
+    return rows, deleted
+
+
+# Get the projects, tasks and comments changed since a sync token
+@route.get("", status_code=status.HTTP_200_OK, response_model=SyncResponse)
+async def sync_changes(
+    db: db_dependency, user: user_dependency, since: Optional[str] = None
+):
+    try:
+        if user is None:
+            raise HTTPException(status_code=401, detail="Authentication Failed")
+
+        settled = await settled_txid(db)
+        # first sync: only the current position, taken before the full download
+        if since is None:
+            if settled is not None:
+                return {"token": encode_sync_token(settled, 0)}
+            last_id = await db.scalar(select(func.max(Change.id)))
+            return {"token": encode_sync_token(0, last_id or 0)}
+
+        txid, change_id, issued_at = decode_sync_token(since)
+        if issued_at < utc_now() - timedelta(days=SYNC_RETENTION_DAYS):
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Sync token expired, reload the projects",
+            )
+
+        conditions = [
+            Change.user_id == user.get("id"),
+            tuple_(Change.txid, Change.id) > tuple_(txid, change_id),
+        ]
+        if settled is not None:
+            conditions.append(Change.txid < settled)
+        result = await db.execute(
+            select(Change.txid, Change.id, Change.entity, Change.entity_id)
+            .where(*conditions)
+            .order_by(Change.txid, Change.id)
+            .limit(SYNC_MAX_CHANGES + 1)
+        )
+        changes = result.all()
+
+        has_more = len(changes) > SYNC_MAX_CHANGES
+        changes = changes[:SYNC_MAX_CHANGES]
+        position = (txid, change_id)
+        if changes:
+            position = (changes[-1].txid, changes[-1].id)
+        if not has_more and settled is not None:
+            position = max(position, (settled, 0))
+
+        # a row changed many times is sent once, as it is now
+        ids = {"projects": set(), "tasks": set(), "comments": set()}
+        for change in changes:
+            ids[f"{change.entity}s"].add(change.entity_id)
+        rows, deleted = await changed_rows(db, user.get("id"), ids)
+
+        return {
+            **rows,
+            "deleted": deleted,
+            "token": encode_sync_token(*position),
+            "has_more": has_more,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("ERREUR sync_changes :", e)
+        traceback.print_exc()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,16 +1,42 @@
 import traceback
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, status
+from decouple import config
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import field_validator
+from sqlalchemy import case, delete, insert, literal, select, update
+from sqlalchemy.orm import selectinload
 
-from src.models import Task
+from src.models import Comment, Project, Task
 from src.routes.auth.auth import get_current_user
+from src.routes.comments.comments import CommentResponse
+from src.services.cache import TASKS, cached_json, response_cache
+from src.services.etag import (
+    list_etag,
+    not_modified,
+    not_modified_response,
+    row_versions,
+)
+from src.services.events import board_events
+from src.services.export import (
+    EXPORT_BATCH_SIZE,
+    EXPORT_MEDIA_TYPES,
+    ExportFormat,
+    attachment,
+    csv_lines,
+    ndjson_line,
+)
+from src.services.pagination import Page, PageParams, paginate
 from src.services.services import *
 
 route = APIRouter(prefix="/tasks", tags=["tasks"])
 
+# largest array accepted by the bulk endpoints
+TASK_BULK_MAX_ITEMS = config("TASK_BULK_MAX_ITEMS", default=500, cast=int)
+
 
 class TaskStatus(str, Enum):
     TODO = "todo"
@@ -24,6 +50,13 @@ class TaskPriority(str, Enum):
     HIGH = "high"
 
 
+# deadlines are stored as naive UTC
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 class TaskRequest(BaseModel):
     title: str
     description: str
@@ -33,6 +66,8 @@ class TaskRequest(BaseModel):
     project_id: int
     # user_id: int
 
+    _deadline_utc = field_validator("deadline")(naive_utc)
+
 
 class TaskUpdate(BaseModel):
     title: Optional[str] = None
@@ -43,27 +78,277 @@ class TaskUpdate(BaseModel):
     project_id: Optional[int] = None
     user_id: Optional[int] = None
 
+    _deadline_utc = field_validator("deadline")(naive_utc)
 
-user_dependency = Annotated[dict, Depends(get_current_user)]
+
+class TaskResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    description: str
+    status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    deadline: Optional[datetime] = None
+    project_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+
+task_columns = response_columns(Task, TaskResponse)
+
+
+# board event data of a task
+def task_event(task) -> dict:
+    return TaskResponse.model_validate(task).model_dump(mode="json")
+
+
+# one board event per project for a batch of tasks
+async def publish_tasks(type: str, tasks):
+    projects = {}
+    for task in tasks:
+        projects.setdefault(task.project_id, []).append(task_event(task))
+    for project_id, data in projects.items():
+        await board_events.publish(project_id, type, data)
+
+
+# a task with its comments when they were asked for with ?include=comments
+class TaskDetail(TaskResponse):
+    comments: Optional[list[CommentResponse]] = None
 
 
-@route.get("/", status_code=status.HTTP_200_OK)
-async def get_tasks(db: db_dependency, user: user_dependency):
+# response data of a loaded task, its comments only when they were included
+def task_detail(task: Task, include: set[str]) -> dict:
+    data = {name: getattr(task, name) for name in TaskResponse.model_fields}
+    if "comments" in include:
+        data["comments"] = task.comment
+    return data
+
+
+# task list select, loading the comments in one extra statement when included
+def task_list_query(include: set[str], *condition):
+    if "comments" in include:
+        return select(Task).options(selectinload(Task.comment)).filter(*condition)
+    return select(*task_columns).filter(*condition)
+
+
+# row versions behind a task list, and behind its comments when included
+def task_list_versions(include: set[str], *condition):
+    versions = [row_versions(Task, *condition)]
+    if "comments" in include:
+        versions.append(row_versions(Comment, Comment.task_id == Task.id, *condition))
+    return versions
+
+
+class TaskBulkUpdate(TaskUpdate):
+    id: int
+
+
+# outcome of one item of a bulk request, in request order
+class TaskBulkResult(BaseModel):
+    index: int
+    ok: bool
+    task: Optional[TaskResponse] = None
+    error: Optional[str] = None
+
+
+class TaskOrder(str, Enum):
+    ID = "id"
+    DEADLINE = "deadline"
+    PRIORITY = "priority"
+
+
+class SortDirection(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+# sort expression used by the paginated task lists (None means by id only)
+def task_sort_key(order_by: TaskOrder):
+    if order_by == TaskOrder.DEADLINE:
+        return Task.deadline
+    if order_by == TaskOrder.PRIORITY:
+        # rank the enum explicitly so every backend orders low < medium < high
+        return case(
+            (Task.priority == TaskPriority.MEDIUM.value, 1),
+            (Task.priority == TaskPriority.HIGH.value, 2),
+            else_=0,
+        )
+    return None
+
+
+# filter query parameters shared by the task list endpoints
+class TaskFilters:
+    def __init__(
+        self,
+        status: Optional[list[TaskStatus]] = Query(None),
+        priority: Optional[list[TaskPriority]] = Query(None),
+        deadline_from: Optional[datetime] = Query(None),
+        deadline_to: Optional[datetime] = Query(None),
+        overdue: bool = Query(False),
+    ):
+        self.status = status
+        self.priority = priority
+        self.deadline_from = naive_utc(deadline_from)
+        self.deadline_to = naive_utc(deadline_to)
+        self.overdue = overdue
+
+    def conditions(self) -> list:
+        conditions = []
+        if self.status:
+            conditions.append(Task.status.in_([value.value for value in self.status]))
+        if self.priority:
+            conditions.append(
+                Task.priority.in_([value.value for value in self.priority])
+            )
+        if self.deadline_from is not None:
+            conditions.append(Task.deadline >= self.deadline_from)
+        if self.deadline_to is not None:
+            conditions.append(Task.deadline < self.deadline_to)
+        if self.overdue:
+            # inline 'done' so Postgres can use the partial open tasks index
+            done = literal(
+                TaskStatus.DONE.value, Task.status.type, literal_execute=True
+            )
+            conditions.append(Task.deadline < naive_utc(datetime.now(timezone.utc)))
+            conditions.append(Task.status != done)
+        return conditions
+
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+page_dependency = Annotated[PageParams, Depends()]
+filters_dependency = Annotated[TaskFilters, Depends()]
+
+comment_export_columns = [
+    Comment.id.label("comment_id"),
+    Comment.content.label("comment_content"),
+    Comment.user_id.label("comment_user_id"),
+]
+
+
+# tasks and their comments, one row per (task, comment) pair
+def task_export_query(*condition):
+    return (
+        select(*task_columns, *comment_export_columns)
+        .outerjoin(Comment, Comment.task_id == Task.id)
+        .where(*condition)
+        .order_by(Task.id, Comment.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+# stream the export rows as they come from a server side cursor
+async def stream_task_export(db, query, export_format: ExportFormat):
+    result = await db.stream(query)
+
+    if export_format == ExportFormat.CSV:
+        yield csv_lines([result.keys()])
+        async for rows in result.partitions():
+            yield csv_lines(rows)
+        return
+
+    # ndjson: one task per line, its comments grouped from consecutive rows
+    task = None
+    async for rows in result.partitions():
+        lines = []
+        for row in rows:
+            if task is None or task["id"] != row.id:
+                if task is not None:
+                    lines.append(ndjson_line(task))
+                task = {name: getattr(row, name) for name in TaskResponse.model_fields}
+                task["comments"] = []
+            if row.comment_id is not None:
+                task["comments"].append(
+                    {
+                        "id": row.comment_id,
+                        "content": row.comment_content,
+                        "user_id": row.comment_user_id,
+                    }
+                )
+        if lines:
+            yield "".join(lines)
+    if task is not None:
+        yield ndjson_line(task)
+
+
+def task_export_response(db, query, export_format: ExportFormat, filename: str):
+    return StreamingResponse(
+        stream_task_export(db, query, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=attachment(filename, export_format),
+    )
+
+
+@route.get(
+    "/",
+    status_code=status.HTTP_200_OK,
+    response_model=Page[TaskDetail],
+    response_model_exclude_unset=True,
+)
+async def get_tasks(
+    request: Request,
+    db: db_dependency,
+    user: user_dependency,
+    page: page_dependency,
+    filters: filters_dependency,
+    order_by: TaskOrder = TaskOrder.ID,
+    direction: SortDirection = SortDirection.ASC,
+    include: Optional[str] = None,
+):
+    include = parse_include(include, {"comments"})
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        tasks = db.query(Task).filter(Task.user_id == user.get("id")).all()
-
-        return tasks
+        conditions = (Task.user_id == user.get("id"), *filters.conditions())
+        query = task_list_query(include, *conditions)
+
+        async def etag():
+            versions = task_list_versions(include, *conditions)
+            return await list_etag(db, request, user.get("id"), *versions)
+
+        async def build():
+            tasks = await paginate(
+                db,
+                query,
+                page,
+                Task.id,
+                task_sort_key(order_by),
+                direction == SortDirection.DESC,
+            )
+            if include:
+                tasks["items"] = [task_detail(task, include) for task in tasks["items"]]
+            return (
+                Page[TaskDetail]
+                .model_validate(tasks)
+                .model_dump_json(exclude_unset=True)
+            )
+
+        return await cached_json(request, user.get("id"), TASKS, etag, build)
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_tasks :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@route.post("/create-task", status_code=status.HTTP_201_CREATED)
+@route.get("/export", status_code=status.HTTP_200_OK)
+async def export_tasks(
+    db: db_dependency,
+    user: user_dependency,
+    format: ExportFormat = ExportFormat.NDJSON,
+):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    query = task_export_query(Task.user_id == user.get("id"))
+    return task_export_response(db, query, format, "tasks")
+
+
+@route.post(
+    "/create-task", status_code=status.HTTP_201_CREATED, response_model=TaskResponse
+)
 async def create_task(db: db_dependency, user: user_dependency, task: TaskRequest):
     try:
         if user is None:
@@ -77,18 +362,25 @@ async def create_task(db: db_dependency, user: user_dependency, task: TaskReques
 
         new_task = Task(**data, user_id=user.get("id"))
         db.add(new_task)
-        db.commit()
-        db.refresh(new_task)
+        await db.commit()
+        await response_cache.invalidate(user.get("id"), TASKS)
+        await board_events.publish(
+            new_task.project_id, "task.created", task_event(new_task)
+        )
 
         return new_task
     except Exception as e:
         print("ERREUR create_task :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@route.put("/update-task/{task_id}", status_code=status.HTTP_200_OK)
+@route.put(
+    "/update-task/{task_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskResponse,
+)
 async def update_task(
     db: db_dependency,
     user: user_dependency,
@@ -99,30 +391,59 @@ async def update_task(
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        existing_task = (
-            db.query(Task)
-            .filter(Task.id == task_id, Task.user_id == user.get("id"))
-            .first()
-        )
+        # update and ownership check in a single UPDATE ... RETURNING
+        values = task.model_dump(exclude_none=True)
+        condition = (Task.id == task_id, Task.user_id == user.get("id"))
+        # a task moved to another project leaves the board it was on
+        previous_project = None
+        if "project_id" in values:
+            previous_project = await db.scalar(
+                select(Task.project_id).where(*condition)
+            )
+        if values:
+            query = (
+                update(Task)
+                .where(*condition)
+                .values(**values)
+                .returning(*task_columns)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            query = select(*task_columns).where(*condition)
+
+        result = await db.execute(query)
+        existing_task = result.first()
         if not existing_task:
             raise HTTPException(status_code=404, detail="Task not found")
 
-        for key, value in task.model_dump().items():
-            if value is not None:
-                setattr(existing_task, key, value)
-
-        db.commit()
-        db.refresh(existing_task)
+        await db.commit()
+        # a task given to another user changes both users' lists
+        for user_id in {user.get("id"), existing_task.user_id}:
+            await response_cache.invalidate(user_id, TASKS)
+        if previous_project not in (None, existing_task.project_id):
+            await board_events.publish(
+                previous_project, "task.deleted", {"id": existing_task.id}
+            )
+        if values:
+            await board_events.publish(
+                existing_task.project_id, "task.updated", task_event(existing_task)
+            )
 
         return existing_task
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR update_task :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@route.delete("/delete-task/{task_id}", status_code=status.HTTP_200_OK)
+@route.delete(
+    "/delete-task/{task_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=TaskResponse,
+)
 async def delete_task(
     db: db_dependency, user: user_dependency, task_id: int = Path(gt=0)
 ):
@@ -130,36 +451,228 @@ async def delete_task(
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        existing_task = (
-            db.query(Task)
-            .filter(Task.id == task_id, Task.user_id == user.get("id"))
-            .first()
+        result = await db.execute(
+            delete(Task)
+            .where(Task.id == task_id, Task.user_id == user.get("id"))
+            .returning(*task_columns)
+            .execution_options(synchronize_session=False)
         )
+        existing_task = result.first()
         if not existing_task:
             raise HTTPException(status_code=404, detail="Task not found")
 
-        db.delete(existing_task)
-        db.commit()
+        await db.commit()
+        await response_cache.invalidate(user.get("id"), TASKS)
+        await board_events.publish(
+            existing_task.project_id, "task.deleted", {"id": existing_task.id}
+        )
         return existing_task
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR delete_task :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@route.get("/user/{user_id}", status_code=status.HTTP_200_OK)
+@route.get(
+    "/user/{user_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=Page[TaskDetail],
+    response_model_exclude_unset=True,
+)
 async def get_user_tasks(
-    db: db_dependency, user: user_dependency, user_id: int = Path(gt=0)
+    request: Request,
+    response: Response,
+    db: db_dependency,
+    user: user_dependency,
+    page: page_dependency,
+    filters: filters_dependency,
+    user_id: int = Path(gt=0),
+    order_by: TaskOrder = TaskOrder.ID,
+    direction: SortDirection = SortDirection.ASC,
+    include: Optional[str] = None,
 ):
+    include = parse_include(include, {"comments"})
     try:
         if user is None:
             raise HTTPException(status_code=401, detail="Authentication Failed")
 
-        tasks = db.query(Task).filter(Task.user_id == user_id).all()
+        conditions = (Task.user_id == user_id, *filters.conditions())
+        versions = task_list_versions(include, *conditions)
+        etag = await list_etag(db, request, user.get("id"), *versions)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+
+        query = task_list_query(include, *conditions)
+        tasks = await paginate(
+            db,
+            query,
+            page,
+            Task.id,
+            task_sort_key(order_by),
+            direction == SortDirection.DESC,
+        )
+        if include:
+            tasks["items"] = [task_detail(task, include) for task in tasks["items"]]
         return tasks
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERREUR get_user_tasks :", e)
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def check_bulk_size(items: list):
+    if len(items) > TASK_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {TASK_BULK_MAX_ITEMS} tasks per bulk request",
+        )
+
+
+@route.post(
+    "/bulk",
+    status_code=status.HTTP_201_CREATED,
+    response_model=list[TaskBulkResult],
+)
+async def create_tasks_bulk(
+    db: db_dependency, user: user_dependency, tasks: list[TaskRequest]
+):
+    check_bulk_size(tasks)
+    try:
+        if user is None:
+            raise HTTPException(status_code=401, detail="Authentication Failed")
+
+        # only insert into projects owned by the user
+        result = await db.execute(
+            select(Project.id).where(
+                Project.id.in_({task.project_id for task in tasks}),
+                Project.user_id == user.get("id"),
+            )
+        )
+        owned_projects = set(result.scalars().all())
+
+        rows = [
+            {**task.model_dump(), "user_id": user.get("id")}
+            for task in tasks
+            if task.project_id in owned_projects
+        ]
+        created_tasks = []
+        if rows:
+            # one multi-row INSERT ... RETURNING, rows come back in request order
+            result = await db.execute(
+                insert(Task).returning(*task_columns, sort_by_parameter_order=True),
+                rows,
+            )
+            created_tasks = result.all()
+
+        await db.commit()
+        await response_cache.invalidate(user.get("id"), TASKS)
+        await publish_tasks("tasks.created", created_tasks)
+
+        created = iter(created_tasks)
+        return [
+            (
+                {"index": index, "ok": True, "task": next(created)}
+                if task.project_id in owned_projects
+                else {"index": index, "ok": False, "error": "Project not found"}
+            )
+            for index, task in enumerate(tasks)
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("ERREUR create_tasks_bulk :", e)
+        traceback.print_exc()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@route.patch(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=list[TaskBulkResult],
+)
+async def update_tasks_bulk(
+    db: db_dependency, user: user_dependency, tasks: list[TaskBulkUpdate]
+):
+    check_bulk_size(tasks)
+    try:
+        if user is None:
+            raise HTTPException(status_code=401, detail="Authentication Failed")
+
+        # merged changes per task id, the last item wins
+        changes = {}
+        for task in tasks:
+            values = task.model_dump(exclude_none=True, exclude={"id"})
+            changes.setdefault(task.id, {}).update(values)
+
+        # one CASE per column keyed on the id, so the whole batch is one UPDATE
+        columns = {}
+        for task_id, values in changes.items():
+            for key, value in values.items():
+                column = getattr(Task, key)
+                columns.setdefault(key, []).append(
+                    (Task.id == task_id, literal(value, column.type))
+                )
+
+        condition = (Task.id.in_(changes), Task.user_id == user.get("id"))
+        # tasks moved to another project leave the board they were on
+        previous_projects = {}
+        if "project_id" in columns:
+            result = await db.execute(
+                select(Task.id, Task.project_id).where(*condition)
+            )
+            previous_projects = dict(result.all())
+        if columns:
+            query = (
+                update(Task)
+                .where(*condition)
+                .values(
+                    {
+                        key: case(*whens, else_=getattr(Task, key))
+                        for key, whens in columns.items()
+                    }
+                )
+                .returning(*task_columns)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            query = select(*task_columns).where(*condition)
+
+        result = await db.execute(query)
+        updated_tasks = {task.id: task for task in result.all()}
+
+        await db.commit()
+        owners = {user.get("id")} | {task.user_id for task in updated_tasks.values()}
+        for user_id in owners:
+            await response_cache.invalidate(user_id, TASKS)
+        moved = {}
+        for task in updated_tasks.values():
+            if previous_projects.get(task.id, task.project_id) != task.project_id:
+                moved.setdefault(previous_projects[task.id], []).append(task.id)
+        for project_id, ids in moved.items():
+            await board_events.publish(project_id, "tasks.deleted", ids)
+        if columns:
+            await publish_tasks("tasks.updated", updated_tasks.values())
+
+        return [
+            (
+                {"index": index, "ok": True, "task": updated_tasks[task.id]}
+                if task.id in updated_tasks
+                else {"index": index, "ok": False, "error": "Task not found"}
+            )
+            for index, task in enumerate(tasks)
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("ERREUR update_tasks_bulk :", e)
+        traceback.print_exc()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
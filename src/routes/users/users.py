@@ -1,20 +1,64 @@
-import shutil
-from pathlib import Path as Pathlib
+import os
+import traceback
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.responses import FileResponse, RedirectResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from src.models import User
-from src.routes.auth.auth import get_current_user
+from src.routes.auth.auth import UserResponse, get_current_user
+from src.services.images import image_processor, pick_variant
 from src.services.services import *
+from src.services.storage import (
+    ProfileUploadRoute,
+    media_url,
+    save_profile_image,
+)
 
-route = APIRouter(prefix="/user", tags=["users"])
+# bodies over the profile image cap are refused before they are spooled
+route = APIRouter(prefix="/user", tags=["users"], route_class=ProfileUploadRoute)
 
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
+class ProfileResponse(BaseModel):
+    message: str
+    user: UserResponse
+
+
+# thumbnails of a new profile image, kept unless another image replaced it since
+async def make_profile_thumbnails(bind, user_id: int, source: str):
+    try:
+        target_dir = os.path.join(os.path.dirname(source), "thumbnails")
+        variants = await image_processor.thumbnails(source, target_dir)
+        async with AsyncSession(bind) as db:
+            await db.execute(
+                update(User)
+                .where(User.id == user_id, User.profile_image == source)
+                .values(profile_variants=variants)
+            )
+            await db.commit()
+    except Exception as e:
+        print("ERREUR make_profile_thumbnails :", e)
+        traceback.print_exc()
+
+
 # Edit user profile
-@route.put("/edit/", status_code=status.HTTP_200_OK)
+@route.put("/edit/", status_code=status.HTTP_200_OK, response_model=ProfileResponse)
 async def edit_user_profile(
+    background_tasks: BackgroundTasks,
     db: db_dependency,
     user: user_dependency,
     username: str = Form(...),
@@ -24,14 +68,14 @@ async def edit_user_profile(
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
 
-    edit_user = db.query(User).filter_by(id=user.get("id")).first()
+    result = await db.execute(select(User).filter_by(id=user.get("id")))
+    edit_user = result.scalars().first()
 
     if profile_image is None:
         setattr(edit_user, "username", username)
         setattr(edit_user, "email", email)
 
-        db.commit()
-        db.refresh(edit_user)
+        await db.commit()
         return {"message": "Profil mis à jour sans image", "user": edit_user}
 
     # Ajout de l'image
@@ -42,19 +86,53 @@ async def edit_user_profile(
                 status_code=400, detail="Ce fichier n'est pas une image valide"
             )
 
-    path = Pathlib.cwd().parent.parent / "images/profiles" / str(user.get("id"))
-    imagepath = Pathlib(path)
-    imagepath.mkdir(exist_ok=True, parents=True)
-
-    file_path = imagepath / f"{user.get('id')}_{profile_image.filename}"
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(profile_image.file, buffer)
+    file_path = await save_profile_image(profile_image, user.get("id"))
 
     setattr(edit_user, "profile_image", str(file_path))
+    # the previous thumbnails are of the previous image
+    setattr(edit_user, "profile_variants", None)
     setattr(edit_user, "username", username)
     setattr(edit_user, "email", email)
 
-    db.commit()
-    db.refresh(edit_user)
+    await db.commit()
+    # resized after the response, on the image worker processes
+    background_tasks.add_task(
+        make_profile_thumbnails, db.bind, edit_user.id, str(file_path)
+    )
     return {"message": "Profil mis à jour avec image", "user": edit_user}
+
+
+# Get the avatar of a user, the smallest thumbnail covering size
+@route.get("/{user_id}/avatar", status_code=status.HTTP_200_OK)
+async def get_user_avatar(
+    request: Request,
+    db: db_dependency,
+    user: user_dependency,
+    user_id: int = Path(gt=0),
+    size: int = Query(64, ge=1, le=1024),
+):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    result = await db.execute(
+        select(User.profile_image, User.profile_variants).filter_by(id=user_id)
+    )
+    avatar = result.first()
+    if avatar is None or avatar.profile_image is None:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+
+    # the original until the thumbnails are ready
+    path, media_type = avatar.profile_image, None
+    if avatar.profile_variants:
+        path, media_type = pick_variant(
+            avatar.profile_variants, size, request.headers.get("accept", "")
+        )
+    if not await run_in_threadpool(os.path.isfile, path):
+        raise HTTPException(status_code=404, detail="Avatar not found")
+
+    # the choice depends on the caller, the file itself is cached for good
+    headers = {"Vary": "Accept", "Cache-Control": "private, max-age=60"}
+    url = media_url(path)
+    if url is not None:
+        return RedirectResponse(url, headers=headers)
+    return FileResponse(path, media_type=media_type, headers={"Vary": "Accept"})
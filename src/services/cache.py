@@ -0,0 +1,247 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from decouple import config
+from fastapi import Request, Response
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+
+from src.services.etag import not_modified, not_modified_response
+from src.services.metrics import register_metrics
+
+# uvicorn workers serving the app, each with its own memory
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", default=1, cast=int)
+# "memory" (LRU per worker), "redis" (shared by every worker) or "none".
+# A write only invalidates the memory cache of the worker handling it, the
+# others keep serving the previous list and ETag (a 304 to the writer) for up
+# to RESPONSE_CACHE_TTL: with several workers, use redis. Off by default then.
+RESPONSE_CACHE_BACKEND = config(
+    "RESPONSE_CACHE_BACKEND", default="memory" if WEB_CONCURRENCY == 1 else "none"
+)
+RESPONSE_CACHE_SIZE = config("RESPONSE_CACHE_SIZE", default=10000, cast=int)
+RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", default=30, cast=int)
+# redis keeps at most this many responses per user and scope
+RESPONSE_CACHE_SCOPE_SIZE = config("RESPONSE_CACHE_SCOPE_SIZE", default=100, cast=int)
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+
+# groups of cached lists, a write invalidates the scopes it changes for a user
+TASKS = "tasks"
+PROJECTS = "projects"
+
+
+# LRU of response bodies, with a version per (user, scope) bumped on invalidation
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.scopes = {}
+        self.versions = OrderedDict()
+
+    async def get(self, user_id: int, scope: str, key: str):
+        version = self.versions.get((user_id, scope), 0)
+        entry = self.entries.get((user_id, scope, key))
+        if entry is None or entry[1] <= time.monotonic():
+            return None, version
+        self.entries.move_to_end((user_id, scope, key))
+        return entry[0], version
+
+    async def set(self, user_id: int, scope: str, key: str, body, version: int):
+        # the lists changed while this body was built
+        if self.versions.get((user_id, scope), 0) != version:
+            return
+        self.entries[(user_id, scope, key)] = (body, time.monotonic() + self.ttl)
+        self.entries.move_to_end((user_id, scope, key))
+        self.scopes.setdefault((user_id, scope), set()).add(key)
+        while len(self.entries) > self.maxsize:
+            (old_user_id, old_scope, old_key), _ = self.entries.popitem(last=False)
+            keys = self.scopes.get((old_user_id, old_scope), set())
+            keys.discard(old_key)
+            if not keys:
+                self.scopes.pop((old_user_id, old_scope), None)
+
+    async def invalidate(self, user_id: int, scopes):
+        for scope in scopes:
+            for key in self.scopes.pop((user_id, scope), ()):
+                self.entries.pop((user_id, scope, key), None)
+            self.versions[(user_id, scope)] = self.versions.get((user_id, scope), 0) + 1
+            self.versions.move_to_end((user_id, scope))
+        while len(self.versions) > self.maxsize:
+            self.versions.popitem(last=False)
+
+    async def clear(self):
+        self.entries.clear()
+        self.scopes.clear()
+        self.versions.clear()
+
+    async def close(self):
+        pass
+
+    def size(self):
+        return len(self.entries)
+
+
+# one hash of response bodies per (user, scope), next to its version counter
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, client: Redis, ttl: int, scope_size: int):
+        self.client = client
+        self.ttl = ttl
+        self.scope_size = scope_size
+
+    @staticmethod
+    def keys(user_id: int, scope: str):
+        entries = f"response_cache:{user_id}:{scope}"
+        return entries, f"{entries}:version"
+
+    async def get(self, user_id: int, scope: str, key: str):
+        entries, version_key = self.keys(user_id, scope)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hget(entries, key)
+            pipe.get(version_key)
+            body, version = await pipe.execute()
+        return body, int(version or 0)
+
+    async def set(self, user_id: int, scope: str, key: str, body, version: int):
+        entries, version_key = self.keys(user_id, scope)
+        async with self.client.pipeline(transaction=True) as pipe:
+            try:
+                # the lists changed while this body was built
+                await pipe.watch(version_key)
+                if int(await pipe.get(version_key) or 0) != version:
+                    return
+                pipe.multi()
+                pipe.hset(entries, key, body)
+                # entries live at most ttl seconds after the first one was stored
+                pipe.expire(entries, self.ttl, nx=True)
+                pipe.hlen(entries)
+                *_, size = await pipe.execute()
+            except WatchError:
+                return
+        if size > self.scope_size:
+            await self.client.delete(entries)
+
+    async def invalidate(self, user_id: int, scopes):
+        async with self.client.pipeline(transaction=True) as pipe:
+            for scope in scopes:
+                entries, version_key = self.keys(user_id, scope)
+                pipe.delete(entries)
+                pipe.incr(version_key)
+                pipe.expire(version_key, self.ttl)
+            await pipe.execute()
+
+    async def clear(self):
+        async for key in self.client.scan_iter(match="response_cache:*"):
+            await self.client.delete(key)
+
+    async def close(self):
+        await self.client.aclose()
+
+    def size(self):
+        return None
+
+
+# serialized list responses per user, a cache error only costs a database read
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, user_id: int, scope: str, key: str):
+        if self.backend is None:
+            return None, None
+        try:
+            body, version = await self.backend.get(user_id, scope, key)
+        except Exception as e:
+            print("ERREUR response_cache get :", e)
+            self.errors += 1
+            return None, None
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body, version
+
+    async def set(self, user_id: int, scope: str, key: str, body, version):
+        if self.backend is None or version is None:
+            return
+        try:
+            await self.backend.set(user_id, scope, key, body, version)
+        except Exception as e:
+            print("ERREUR response_cache set :", e)
+            self.errors += 1
+
+    async def invalidate(self, user_id: Optional[int], *scopes: str):
+        if self.backend is None or user_id is None:
+            return
+        try:
+            await self.backend.invalidate(user_id, scopes)
+        except Exception as e:
+            print("ERREUR response_cache invalidate :", e)
+            self.errors += 1
+
+    async def clear(self):
+        if self.backend is not None:
+            await self.backend.clear()
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self):
+        return {
+            "backend": "none" if self.backend is None else self.backend.name,
+            "size": None if self.backend is None else self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+def create_backend(name: str):
+    if name == "memory":
+        return MemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+    if name == "redis":
+        return RedisBackend(
+            Redis.from_url(REDIS_URL), RESPONSE_CACHE_TTL, RESPONSE_CACHE_SCOPE_SIZE
+        )
+    return None
+
+
+response_cache = ResponseCache(create_backend(RESPONSE_CACHE_BACKEND))
+
+register_metrics("response_cache", response_cache.stats)
+
+
+# the path and sorted query string identify a cached list of a user
+def request_key(request: Request) -> str:
+    query = sorted(request.query_params.multi_items())
+    return hashlib.sha256(f"{request.url.path}?{query}".encode()).hexdigest()
+
+
+# read-through: the cached JSON body of a list, or build, store and return it
+# an entry is "<etag>\n<body>", so a matching If-None-Match costs no query
+async def cached_json(request: Request, user_id: int, scope: str, etag, build):
+    key = request_key(request)
+    entry, version = await response_cache.get(user_id, scope, key)
+    if entry is not None:
+        if isinstance(entry, bytes):
+            entry = entry.decode()
+        tag, _, body = entry.partition("\n")
+        if not_modified(request, tag):
+            return not_modified_response(tag)
+    else:
+        # computed before the body, a write in between only costs a 200 later
+        tag = await etag()
+        if not_modified(request, tag):
+            return not_modified_response(tag)
+        body = await build()
+        await response_cache.set(user_id, scope, key, f"{tag}\n{body}", version)
+    return Response(content=body, media_type="application/json", headers={"ETag": tag})
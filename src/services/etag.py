@@ -0,0 +1,37 @@
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import func, literal, select, union_all
+
+
+# count, last update and version sum of the rows a response is built from
+def row_versions(model, *condition):
+    return select(
+        func.count(model.id), func.max(model.updated_at), func.sum(model.version)
+    ).where(*condition)
+
+
+# weak ETag of a response: the request, the caller and the versions of its rows
+async def list_etag(db, request: Request, user_id: int, *queries) -> str:
+    # every aggregate in one statement, tagged to keep their order
+    query = union_all(
+        *[query.add_columns(literal(index)) for index, query in enumerate(queries)]
+    )
+    rows = sorted((await db.execute(query)).all(), key=lambda row: row[-1])
+
+    parts = [request.url.path, sorted(request.query_params.multi_items()), user_id]
+    parts += [tuple(row) for row in rows]
+    return f'W/"{hashlib.sha256(repr(parts).encode()).hexdigest()[:32]}"'
+
+
+# the client already holds this version (weak comparison)
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
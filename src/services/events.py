@@ -0,0 +1,204 @@
+import asyncio
+import json
+
+import asyncpg
+from decouple import config
+from sqlalchemy.engine import make_url
+
+from src.database import SQLALCHEMY_DATABASE_URL
+from src.services.metrics import register_metrics
+
+# "memory" (sockets of this worker), "postgres" (LISTEN/NOTIFY, every worker)
+# or "none"
+BOARD_EVENTS_BACKEND = config("BOARD_EVENTS_BACKEND", default="memory")
+# events waiting per socket, a client falling further behind is disconnected
+BOARD_EVENTS_QUEUE_SIZE = config("BOARD_EVENTS_QUEUE_SIZE", default=100, cast=int)
+# LISTEN needs a session of its own, not a pgbouncer transaction pooled one
+BOARD_EVENTS_DATABASE_URL = config(
+    "BOARD_EVENTS_DATABASE_URL", default=SQLALCHEMY_DATABASE_URL
+)
+BOARD_EVENTS_CHANNEL = "board_events"
+# postgres refuses NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_PAYLOAD = 7999
+
+
+# events of one project waiting to be sent on one socket
+class Subscription:
+    def __init__(self, project_id: int, size: int):
+        self.project_id = project_id
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+    def put(self, message: str) -> bool:
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # the client missed events, it reconnects and reloads the board
+            self.overflowed = True
+            return False
+        return True
+
+
+# events go straight to the sockets of this worker
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self):
+        self.deliver = None
+
+    async def start(self):
+        pass
+
+    async def publish(self, project_id: int, message: str):
+        self.deliver(project_id, message)
+
+    async def close(self):
+        pass
+
+
+# events go through a NOTIFY, every worker LISTENs and fans them out
+class PostgresBackend:
+    name = "postgres"
+
+    def __init__(self, url: str):
+        self.url = url
+        self.connection = None
+        self.deliver = None
+        self.lock = asyncio.Lock()
+        self.reconnecting = None
+
+    async def start(self):
+        await self.connect()
+
+    async def connect(self):
+        self.connection = await asyncpg.connect(self.url)
+        self.connection.add_termination_listener(self.on_termination)
+        await self.connection.add_listener(BOARD_EVENTS_CHANNEL, self.on_notify)
+
+    def on_notify(self, connection, pid, channel, payload):
+        event = json.loads(payload)
+        self.deliver(event["project_id"], payload)
+
+    # events sent while the listener is down are lost, clients reload on reconnect
+    def on_termination(self, connection):
+        self.connection = None
+        if self.reconnecting is None:
+            self.reconnecting = asyncio.create_task(self.reconnect())
+
+    async def reconnect(self):
+        delay = 1
+        while self.connection is None:
+            await asyncio.sleep(delay)
+            try:
+                await self.connect()
+            except Exception as e:
+                print("ERREUR board_events reconnect :", e)
+                delay = min(delay * 2, 30)
+        self.reconnecting = None
+
+    async def publish(self, project_id: int, message: str):
+        if len(message.encode()) > NOTIFY_MAX_PAYLOAD:
+            # too big for a NOTIFY, the clients reload the board instead
+            event = json.loads(message)
+            event = {"type": event["type"], "project_id": project_id}
+            message = json.dumps(event, separators=(",", ":"))
+        if self.connection is None:
+            raise ConnectionError("board events listener is not connected")
+        # one connection, one statement at a time
+        async with self.lock:
+            await self.connection.execute(
+                "SELECT pg_notify($1, $2)", BOARD_EVENTS_CHANNEL, message
+            )
+
+    async def close(self):
+        if self.reconnecting is not None:
+            self.reconnecting.cancel()
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            connection.remove_termination_listener(self.on_termination)
+            await connection.close()
+
+
+# change events of the project boards, published once a write is committed
+# a publish error only costs the clients a reload
+class BoardEvents:
+    def __init__(self, backend, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.subscriptions = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        if backend is not None:
+            backend.deliver = self.deliver
+
+    async def start(self):
+        if self.backend is not None:
+            await self.backend.start()
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+    def subscribe(self, project_id: int) -> Subscription:
+        subscription = Subscription(project_id, self.queue_size)
+        self.subscriptions.setdefault(project_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self.subscriptions.get(subscription.project_id, set())
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            self.subscriptions.pop(subscription.project_id, None)
+
+    # the message is serialized once for every socket of the project
+    def deliver(self, project_id: int, message: str):
+        for subscription in self.subscriptions.get(project_id, ()):
+            if subscription.put(message):
+                self.delivered += 1
+            else:
+                self.dropped += 1
+
+    async def publish(self, project_id, type: str, data=None):
+        if self.backend is None or project_id is None:
+            return
+        event = {"type": type, "project_id": project_id}
+        if data is not None:
+            event["data"] = data
+        try:
+            await self.backend.publish(
+                project_id, json.dumps(event, separators=(",", ":"))
+            )
+            self.published += 1
+        except Exception as e:
+            print("ERREUR board_events publish :", e)
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "backend": "none" if self.backend is None else self.backend.name,
+            "sockets": sum(len(value) for value in self.subscriptions.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+def create_backend(name: str):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "postgres":
+        url = make_url(BOARD_EVENTS_DATABASE_URL).set(drivername="postgresql")
+        return PostgresBackend(url.render_as_string(hide_password=False))
+    return None
+
+
+board_events = BoardEvents(
+    create_backend(BOARD_EVENTS_BACKEND), BOARD_EVENTS_QUEUE_SIZE
+)
+
+register_metrics("board_events", board_events.stats)
@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+
+from decouple import config
+
+# rows fetched per round trip while streaming an export
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", default=500, cast=int)
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_line(data: dict) -> str:
+    return json.dumps(data, default=json_default, separators=(",", ":")) + "\n"
+
+
+def csv_lines(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            for row in rows
+        ]
+    )
+    return buffer.getvalue()
+
+
+def attachment(filename: str, export_format: ExportFormat):
+    return {
+        "Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'
+    }
@@ -0,0 +1,132 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path as Pathlib
+from uuid import uuid4
+
+from decouple import Csv, config
+from PIL import Image, ImageOps
+
+from src.services.metrics import register_metrics
+
+IMAGE_WORKERS = config("IMAGE_WORKERS", default=2, cast=int)
+# square avatar sizes generated for every profile image, in pixels
+PROFILE_THUMBNAIL_SIZES = config(
+    "PROFILE_THUMBNAIL_SIZES", default="32,64,128,256", cast=Csv(int)
+)
+THUMBNAIL_WEBP_QUALITY = config("THUMBNAIL_WEBP_QUALITY", default=80, cast=int)
+THUMBNAIL_JPEG_QUALITY = config("THUMBNAIL_JPEG_QUALITY", default=85, cast=int)
+
+# formats of every thumbnail, webp for the browsers accepting it
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+
+def save_image(image: Image.Image, path: Pathlib, image_format: str):
+    temp_path = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    # no exif, icc or xmp argument, the thumbnails carry no metadata
+    if image_format == "WEBP":
+        image.save(temp_path, "WEBP", quality=THUMBNAIL_WEBP_QUALITY, method=4)
+    else:
+        image.save(
+            temp_path,
+            "JPEG",
+            quality=THUMBNAIL_JPEG_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    os.replace(temp_path, path)
+
+
+# runs in a worker process: {size: {format: path}} of the square thumbnails
+def make_thumbnails(source: str, target_dir: str, sizes: list[int]) -> dict:
+    target = Pathlib(target_dir)
+    target.mkdir(parents=True, exist_ok=True)
+    stem = Pathlib(source).stem
+
+    with Image.open(source) as image:
+        # jpeg decodes straight at a reduced scale, far less work for big photos
+        image.draft("RGB", (max(sizes), max(sizes)))
+        # phones store the rotation in exif, apply it before exif is dropped
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if alpha else "RGB")
+
+        variants = {}
+        for size in sorted(sizes, reverse=True):
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            variants[str(size)] = {}
+            for name, (image_format, _) in THUMBNAIL_FORMATS.items():
+                output = thumbnail
+                if image_format == "JPEG" and output.mode == "RGBA":
+                    # jpeg has no alpha, flatten on white
+                    output = Image.new("RGB", output.size, "white")
+                    output.paste(thumbnail, mask=thumbnail.getchannel("A"))
+                path = target / f"{stem}_{size}.{name}"
+                save_image(output, path, image_format)
+                variants[str(size)][name] = str(path)
+    return variants
+
+
+# image work on its own processes, resizing holds the GIL
+class ImageProcessor:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    async def run(self, func, *args):
+        self.pending += 1
+        try:
+            if self.executor is None:
+                # spawned, forking a process running threads and a loop is unsafe
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, func, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    async def thumbnails(self, source: str, target_dir: str) -> dict:
+        return await self.run(
+            make_thumbnails, source, target_dir, list(PROFILE_THUMBNAIL_SIZES)
+        )
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+image_processor = ImageProcessor(IMAGE_WORKERS)
+
+register_metrics("image_processor", image_processor.stats)
+
+
+# the smallest variant covering size, webp when the client accepts it
+def pick_variant(variants: dict, size: int, accept: str):
+    sizes = sorted(int(value) for value in variants)
+    chosen = next((value for value in sizes if value >= size), sizes[-1])
+    name = "webp" if "image/webp" in accept else "jpeg"
+    return variants[str(chosen)][name], THUMBNAIL_FORMATS[name][1]
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+
+from src.services.export import ExportFormat
+
+# rows validated and written per COPY / executemany batch
+IMPORT_BATCH_SIZE = config("IMPORT_BATCH_SIZE", default=1000, cast=int)
+# errors reported back to the client, the rest are only counted
+IMPORT_MAX_ERRORS = config("IMPORT_MAX_ERRORS", default=100, cast=int)
+
+
+# (line number, record) pairs read lazily from the uploaded file
+def iter_records(file, import_format: ExportFormat):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+    if import_format == ExportFormat.CSV:
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+
+
+def read_batch(records, size: int):
+    try:
+        return list(islice(records, size))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File is not valid UTF-8")
+
+
+# parse the upload one batch at a time off the event loop
+async def iter_batches(file, import_format: ExportFormat):
+    records = iter_records(file, import_format)
+    while True:
+        batch = await run_in_threadpool(read_batch, records, IMPORT_BATCH_SIZE)
+        if not batch:
+            return
+        yield batch
+
+
+# COPY the rows on Postgres, batched executemany everywhere else
+async def copy_rows(db, model, columns: list[str], rows: list[tuple]):
+    connection = await db.connection()
+    if connection.dialect.name == "postgresql":
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            model.__tablename__, records=rows, columns=columns
+        )
+        return
+
+    await db.execute(insert(model), [dict(zip(columns, row)) for row in rows])
@@ -0,0 +1,15 @@
+from src.database import pool_metrics
+
+# collectors reporting the state of the in-process pools and caches
+collectors = {}
+
+
+def register_metrics(name: str, collector):
+    collectors[name] = collector
+
+
+def collect_metrics():
+    return {name: collector() for name, collector in collectors.items()}
+
+
+register_metrics("db_pool", pool_metrics.stats)
@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Generic, Optional, TypeVar
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
+
+
+# turn the sort values of the last row into an opaque cursor
+def encode_cursor(values: list) -> str:
+    data = [
+        {"datetime": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# a sort value read from a cursor: a scalar, null (nulls last) or a datetime
+def decode_cursor_value(value):
+    if value is None or (
+        isinstance(value, (int, float, str)) and not isinstance(value, bool)
+    ):
+        return value
+    if isinstance(value, dict) and list(value) == ["datetime"]:
+        return datetime.fromisoformat(value["datetime"])
+    raise ValueError(value)
+
+
+# read back the sort values stored in a cursor, anything else is refused
+# before it reaches a query
+def decode_cursor(cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        if not isinstance(data, list) or not data:
+            raise ValueError(cursor)
+        return [decode_cursor_value(value) for value in data]
+    except (binascii.Error, ValueError, TypeError, RecursionError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# query parameters shared by every paginated list endpoint
+class PageParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    ):
+        self.cursor = decode_cursor(cursor) if cursor else None
+        self.limit = limit
+
+
+# rows coming after the cursor for the (sort_key, id) ordering
+def after_cursor(sort_key, id_column, values: list, descending: bool = False):
+    def beyond(column, value):
+        return column < value if descending else column > value
+
+    if sort_key is None:
+        return beyond(id_column, values[0])
+
+    value, last_id = values
+    if value is None:
+        return and_(sort_key.is_(None), beyond(id_column, last_id))
+    return or_(
+        beyond(sort_key, value),
+        and_(sort_key == value, beyond(id_column, last_id)),
+        sort_key.is_(None),
+    )
+
+
+# run a select() one page at a time, ordered by sort_key (nulls last) then id
+async def paginate(
+    db, query, page: PageParams, id_column, sort_key=None, descending: bool = False
+):
+    keys = [id_column] if sort_key is None else [sort_key, id_column]
+
+    if page.cursor is not None:
+        if len(page.cursor) != len(keys):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(after_cursor(sort_key, id_column, page.cursor, descending))
+
+    # an entity select yields the entity, a column select yields one dict per row
+    size = len(query.column_descriptions)
+    if sort_key is not None:
+        query = query.order_by(sort_key.is_(None))
+    query = query.add_columns(
+        *[key.label(f"cursor_{index}") for index, key in enumerate(keys)]
+    )
+    query = query.order_by(*[key.desc() if descending else key for key in keys])
+    query = query.limit(page.limit + 1)
+
+    rows = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[: page.limit]
+        next_cursor = encode_cursor(list(rows[-1][size:]))
+
+    if size == 1:
+        items = [row[0] for row in rows]
+    else:
+        items = [dict(zip(row._fields[:size], row[:size])) for row in rows]
+    return {"items": items, "next_cursor": next_cursor}
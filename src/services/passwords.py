@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from src.services.metrics import register_metrics
+
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=2, cast=int)
+PASSWORD_HASH_MAX_PENDING = config("PASSWORD_HASH_MAX_PENDING", default=32, cast=int)
+
+# config to hash password
+bcrypt_contex = CryptContext(["argon2", "bcrypt"], deprecated="auto")
+
+
+# run the argon2 work on its own threads so it never blocks the event loop
+class PasswordHasher:
+    def __init__(self, context: CryptContext, workers: int, max_pending: int):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queued": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    async def run(self, func, *args):
+        # shed load instead of letting every login wait behind the queue
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many authentication requests, retry later",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(self.context.verify, password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    bcrypt_contex, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+)
+
+register_metrics("password_hasher", password_hasher.stats)
@@ -0,0 +1,175 @@
+import re
+
+from sqlalchemy import (
+    Float,
+    cast,
+    column,
+    event,
+    func,
+    literal_column,
+    select,
+    table,
+    text,
+    union_all,
+)
+
+from src.database import Base
+from src.models import Comment, Task
+
+# text search configuration of the Postgres tsvector columns
+SEARCH_CONFIG = "english"
+
+# generated tsvector columns, one per searchable table
+SEARCH_VECTORS = [
+    ("tasks", "coalesce(title, '') || ' ' || coalesce(description, '')"),
+    ("comments", "coalesce(content, '')"),
+]
+
+# FTS5 external content tables used on SQLite instead
+SQLITE_FTS = [
+    ("tasks", ["title", "description"]),
+    ("comments", ["content"]),
+]
+
+# the search DDL below is run both by create_all (DB_CREATE_ALL, the tests)
+# and by migration 5e2a91c4b7d0, so the two schemas cannot drift apart
+
+# tsvector columns kept in sync by Postgres
+POSTGRES_SEARCH_COLUMNS_DDL = [
+    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', {document})) STORED"
+    for table, document in SEARCH_VECTORS
+]
+POSTGRES_DROP_SEARCH_COLUMNS_DDL = [
+    f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector"
+    for table, _ in reversed(SEARCH_VECTORS)
+]
+
+
+# GIN indexes of the tsvector columns, built concurrently by the migration
+def postgres_search_index_ddl(concurrently: bool = False) -> list[str]:
+    mode = "CONCURRENTLY " if concurrently else ""
+    return [
+        f"CREATE INDEX {mode}IF NOT EXISTS ix_{table}_search_vector "
+        f"ON {table} USING gin (search_vector)"
+        for table, _ in SEARCH_VECTORS
+    ]
+
+
+def postgres_drop_search_index_ddl(concurrently: bool = False) -> list[str]:
+    mode = "CONCURRENTLY " if concurrently else ""
+    return [
+        f"DROP INDEX {mode}IF EXISTS ix_{table}_search_vector"
+        for table, _ in reversed(SEARCH_VECTORS)
+    ]
+
+
+POSTGRES_SEARCH_DDL = POSTGRES_SEARCH_COLUMNS_DDL + postgres_search_index_ddl()
+
+
+# FTS5 index over an external content table, kept in sync by triggers
+def sqlite_fts_ddl(source: str, columns: list[str]) -> list[str]:
+    fts = f"{source}_fts"
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{name}" for name in columns)
+    old = ", ".join(f"old.{name}" for name in columns)
+    remove = (
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    )
+    add = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, "
+        f"content='{source}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {source} "
+        f"BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {source} "
+        f"BEGIN {remove} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} "
+        f"ON {source} BEGIN {remove} {add} END",
+        # index the rows that were there before the FTS table
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+SQLITE_SEARCH_DDL = [
+    statement
+    for table, columns in SQLITE_FTS
+    for statement in sqlite_fts_ddl(table, columns)
+]
+SQLITE_DROP_SEARCH_DDL = [
+    statement
+    for table, _ in reversed(SQLITE_FTS)
+    for statement in [
+        f"DROP TRIGGER IF EXISTS {table}_fts_insert",
+        f"DROP TRIGGER IF EXISTS {table}_fts_delete",
+        f"DROP TRIGGER IF EXISTS {table}_fts_update",
+        f"DROP TABLE IF EXISTS {table}_fts",
+    ]
+]
+
+
+# create_all only knows the mapped columns, add the search structures after it
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        statements = POSTGRES_SEARCH_DDL
+    elif connection.dialect.name == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'")
+        ).first()
+        statements = [] if exists else SQLITE_SEARCH_DDL
+    else:
+        return
+
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+# words of the search query, empty when there is nothing to look for
+def search_terms(q: str) -> list[str]:
+    return re.findall(r"\w+", q)
+
+
+# (task_id, rank) of the user's tasks matching q, a higher rank is a better match
+def ranked_task_ids(dialect: str, q: str, user_id: int):
+    if dialect == "postgresql":
+        query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        task_vector = literal_column("tasks.search_vector")
+        comment_vector = literal_column("comments.search_vector")
+        task_rank = func.ts_rank(task_vector, query)
+        comment_rank = func.ts_rank(comment_vector, query)
+        task_match = task_vector.op("@@")(query)
+        comment_match = comment_vector.op("@@")(query)
+        task_hits = select(Task.id.label("task_id"), task_rank.label("rank"))
+        comment_hits = select(
+            Comment.task_id.label("task_id"), comment_rank.label("rank")
+        )
+    else:
+        # quoted terms, FTS5 matches rows containing all of them
+        query = " ".join(f'"{term}"' for term in search_terms(q))
+        tasks_fts = table("tasks_fts", column("rowid"))
+        comments_fts = table("comments_fts", column("rowid"))
+        # bm25 is lower for better matches
+        task_rank = -func.bm25(literal_column("tasks_fts"))
+        comment_rank = -func.bm25(literal_column("comments_fts"))
+        task_match = literal_column("tasks_fts").op("MATCH")(query)
+        comment_match = literal_column("comments_fts").op("MATCH")(query)
+        task_hits = select(Task.id.label("task_id"), task_rank.label("rank")).join(
+            tasks_fts, tasks_fts.c.rowid == Task.id
+        )
+        comment_hits = select(
+            Comment.task_id.label("task_id"), comment_rank.label("rank")
+        ).join(comments_fts, comments_fts.c.rowid == Comment.id)
+
+    task_hits = task_hits.where(Task.user_id == user_id, task_match)
+    comment_hits = comment_hits.join(Task, Task.id == Comment.task_id).where(
+        Task.user_id == user_id, comment_match
+    )
+
+    # a task ranks by its best match, in its own text or one of its comments
+    hits = union_all(task_hits, comment_hits).subquery()
+    return (
+        select(hits.c.task_id, cast(func.max(hits.c.rank), Float).label("rank"))
+        .group_by(hits.c.task_id)
+        .subquery()
+    )
@@ -1,21 +1,42 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import Depends, Path
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from decouple import config
+from fastapi import Depends, HTTPException, Path
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database import SessionLocal, engin
 from src.models import Base
 
-Base.metadata.create_all(bind=engin)
+# the schema is managed by "alembic upgrade head", create_all is for local runs
+DB_CREATE_ALL = config("DB_CREATE_ALL", default=False, cast=bool)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+# create the missing tables straight from the models
+async def init_db():
+    async with engin.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+
+
+# columns of an entity needed to build a response model
+def response_columns(entity, schema: type[BaseModel]):
+    return [getattr(entity, name) for name in schema.model_fields]
+
+
+# related collections asked for with ?include=a,b
+def parse_include(include: Optional[str], allowed: set[str]) -> set[str]:
+    names = {name.strip() for name in (include or "").split(",") if name.strip()}
+    unknown = names - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}"
+        )
+    return names
@@ -0,0 +1,141 @@
+import hashlib
+import os
+from pathlib import Path as Pathlib
+from typing import Optional
+from urllib.parse import quote
+from uuid import uuid4
+
+from decouple import config
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+# uploaded files live under this directory
+MEDIA_ROOT = Pathlib(
+    config("MEDIA_ROOT", default=str(Pathlib.cwd().parent.parent / "images"))
+)
+# bytes read and written at a time while copying an upload
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", default=1024 * 1024, cast=int)
+PROFILE_IMAGE_MAX_BYTES = config(
+    "PROFILE_IMAGE_MAX_BYTES", default=5 * 1024 * 1024, cast=int
+)
+# room left in a request body for the multipart boundaries, the part headers
+# and the other form fields next to the file
+UPLOAD_FORM_OVERHEAD = config("UPLOAD_FORM_OVERHEAD", default=64 * 1024, cast=int)
+
+# extensions kept on stored images, anything else is served as plain bytes so
+# an upload can never come back as html or svg from our origin
+IMAGE_SUFFIXES = {".gif", ".jpeg", ".jpg", ".png", ".webp"}
+
+
+def too_large(max_bytes: int):
+    return HTTPException(status_code=413, detail=f"File larger than {max_bytes} bytes")
+
+
+# the request stream, failing once more than max_bytes were received
+def limit_body(receive, max_bytes: int):
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise too_large(max_bytes)
+        return message
+
+    return limited_receive
+
+
+# route refusing a request body over max_body_bytes() while it is received:
+# Starlette reads and spools a whole multipart body before the handler runs,
+# so a cap checked on the UploadFile comes after the bytes hit the disk
+class LimitedBodyRoute(APIRoute):
+    def max_body_bytes(self) -> int:
+        raise NotImplementedError
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request):
+            max_bytes = self.max_body_bytes()
+            length = request.headers.get("content-length", "")
+            if length.isdigit() and int(length) > max_bytes:
+                raise too_large(max_bytes)
+            receive = limit_body(request.receive, max_bytes)
+            return await handler(Request(request.scope, receive))
+
+        return limited_handler
+
+
+class ProfileUploadRoute(LimitedBodyRoute):
+    def max_body_bytes(self) -> int:
+        return PROFILE_IMAGE_MAX_BYTES + UPLOAD_FORM_OVERHEAD
+
+
+# copy in chunks up to max_bytes into a temp file next to path, hashing it
+def copy_to_temp(source, path: Pathlib, max_bytes: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as buffer:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large(max_bytes)
+                digest.update(chunk)
+                buffer.write(chunk)
+            buffer.flush()
+            os.fsync(buffer.fileno())
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path, size, digest.hexdigest()
+
+
+# stored as <sha256><suffix>: a new content gets a new name and url, so the
+# files are never modified and can be cached forever. The file only shows up
+# under its name once complete, a failed or refused upload leaves nothing behind
+def write_hashed_file(source, directory: Pathlib, suffix: str, max_bytes: int):
+    temp_path, _, digest = copy_to_temp(source, directory / "upload", max_bytes)
+    path = directory / f"{digest}{suffix}"
+    os.replace(temp_path, path)
+    return path
+
+
+async def save_profile_image(upload: UploadFile, user_id: int) -> Pathlib:
+    if upload.size is not None and upload.size > PROFILE_IMAGE_MAX_BYTES:
+        raise too_large(PROFILE_IMAGE_MAX_BYTES)
+    suffix = Pathlib(upload.filename or "").suffix.lower()
+    if suffix not in IMAGE_SUFFIXES:
+        suffix = ".bin"
+    directory = MEDIA_ROOT / "profiles" / str(user_id)
+    return await run_in_threadpool(
+        write_hashed_file, upload.file, directory, suffix, PROFILE_IMAGE_MAX_BYTES
+    )
+
+
+# url of a stored file under GET /media, None when it is not under MEDIA_ROOT
+def media_url(path: Optional[str]) -> Optional[str]:
+    if not path:
+        return None
+    try:
+        relative = Pathlib(path).relative_to(MEDIA_ROOT)
+    except ValueError:
+        return None
+    return f"/media/{quote(relative.as_posix())}"
+
+
+# the stored file behind a media url, None for anything outside MEDIA_ROOT,
+# missing or still being written
+def media_path(relative: str) -> Optional[Pathlib]:
+    root = MEDIA_ROOT.resolve()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root) or path.name.startswith("."):
+        return None
+    if not path.is_file():
+        return None
+    return path
@@ -0,0 +1,170 @@
+import asyncio
+from datetime import timedelta
+
+from decouple import config
+from sqlalchemy import delete, event, func, select, text
+
+from src.database import Base, SessionLocal
+from src.models import Change, utc_now
+
+# changes returned by one GET /sync, the client asks again while has_more
+SYNC_MAX_CHANGES = config("SYNC_MAX_CHANGES", default=1000, cast=int)
+# older changes are pruned, a token older than this needs a full reload
+SYNC_RETENTION_DAYS = config("SYNC_RETENTION_DAYS", default=30, cast=int)
+# seconds between two prunes of the change log, 0 disables it
+SYNC_PRUNE_INTERVAL = config("SYNC_PRUNE_INTERVAL", default=3600, cast=int)
+
+# (user_id, entity, entity_id) of the owners of the rows of a postgres
+# transition table, the project owners are the ones syncing a row
+POSTGRES_OWNERS = {
+    "projects": "SELECT r.user_id, 'project', r.id FROM {rows} r",
+    "tasks": "SELECT p.user_id, 'task', r.id FROM {rows} r "
+    "JOIN projects p ON p.id = r.project_id",
+    "comments": "SELECT p.user_id, 'comment', r.id FROM {rows} r "
+    "JOIN tasks t ON t.id = r.task_id JOIN projects p ON p.id = t.project_id",
+}
+
+# the same for the new / old row of a sqlite row trigger
+SQLITE_OWNERS = {
+    "projects": "SELECT {row}.user_id, 'project', {row}.id",
+    "tasks": "SELECT p.user_id, 'task', {row}.id FROM projects p "
+    "WHERE p.id = {row}.project_id",
+    "comments": "SELECT p.user_id, 'comment', {row}.id FROM tasks t "
+    "JOIN projects p ON p.id = t.project_id WHERE t.id = {row}.task_id",
+}
+
+# comments of a task moved to another project change board with it
+POSTGRES_MOVED_COMMENTS = (
+    "SELECT p.user_id, 'comment', c.id FROM new_rows n "
+    "JOIN old_rows o ON o.id = n.id JOIN comments c ON c.task_id = n.id "
+    "JOIN projects p ON p.id IN (n.project_id, o.project_id) "
+    "WHERE n.project_id IS DISTINCT FROM o.project_id"
+)
+SQLITE_MOVED_COMMENTS = (
+    "SELECT p.user_id, 'comment', c.id FROM comments c "
+    "JOIN projects p ON p.id IN (new.project_id, old.project_id) "
+    "WHERE c.task_id = new.id AND new.project_id IS NOT old.project_id"
+)
+
+LOG_CHANGES = "INSERT INTO changes (user_id, entity, entity_id)"
+LOG_POSTGRES_CHANGES = "INSERT INTO changes (user_id, entity, entity_id, txid)"
+
+
+# statement triggers reading the transition tables, one log insert per statement
+def postgres_change_ddl(table: str) -> list[str]:
+    owners = POSTGRES_OWNERS[table]
+    new, old = owners.format(rows="new_rows"), owners.format(rows="old_rows")
+    updated = [f"({new} UNION {old})"]
+    if table == "tasks":
+        updated.append(f"({POSTGRES_MOVED_COMMENTS})")
+
+    def log(query: str) -> str:
+        return f"{LOG_POSTGRES_CHANGES} SELECT *, txid_current() FROM {query} AS o;"
+
+    function = f"log_{table}_changes"
+    statements = [
+        f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger "
+        f"LANGUAGE plpgsql AS $$ BEGIN "
+        f"IF TG_OP = 'INSERT' THEN {log(f'({new})')} "
+        f"ELSIF TG_OP = 'UPDATE' THEN {' '.join(log(query) for query in updated)} "
+        f"ELSE {log(f'({old})')} "
+        f"END IF; RETURN NULL; END $$"
+    ]
+    for operation, transition in [
+        ("insert", "NEW TABLE AS new_rows"),
+        ("update", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("delete", "OLD TABLE AS old_rows"),
+    ]:
+        trigger = f"{table}_changes_{operation}"
+        statements += [
+            f"DROP TRIGGER IF EXISTS {trigger} ON {table}",
+            f"CREATE TRIGGER {trigger} AFTER {operation.upper()} ON {table} "
+            f"REFERENCING {transition} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION {function}()",
+        ]
+    return statements
+
+
+# row triggers, sqlite has no transition tables
+def sqlite_change_ddl(table: str) -> list[str]:
+    owners = SQLITE_OWNERS[table]
+    new, old = owners.format(row="new"), owners.format(row="old")
+    updated = f"{LOG_CHANGES} {new} UNION {old};"
+    if table == "tasks":
+        updated += f" {LOG_CHANGES} {SQLITE_MOVED_COMMENTS};"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT "
+        f"ON {table} BEGIN {LOG_CHANGES} {new}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE "
+        f"ON {table} BEGIN {updated} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE "
+        f"ON {table} BEGIN {LOG_CHANGES} {old}; END",
+    ]
+
+
+# run both by create_all (DB_CREATE_ALL, the tests) and by migration
+# c7b3d9e2f415, so the two schemas cannot drift apart
+POSTGRES_SYNC_DDL = [
+    statement for table in POSTGRES_OWNERS for statement in postgres_change_ddl(table)
+]
+SQLITE_SYNC_DDL = [
+    statement for table in SQLITE_OWNERS for statement in sqlite_change_ddl(table)
+]
+POSTGRES_DROP_SYNC_DDL = [
+    statement
+    for table in reversed(list(POSTGRES_OWNERS))
+    for statement in [
+        *[
+            f"DROP TRIGGER IF EXISTS {table}_changes_{operation} ON {table}"
+            for operation in ["insert", "update", "delete"]
+        ],
+        f"DROP FUNCTION IF EXISTS log_{table}_changes()",
+    ]
+]
+SQLITE_DROP_SYNC_DDL = [
+    f"DROP TRIGGER IF EXISTS {table}_changes_{operation}"
+    for table in reversed(list(SQLITE_OWNERS))
+    for operation in ["insert", "update", "delete"]
+]
+
+
+# create_all only knows the changes table, add the triggers filling it after it
+@event.listens_for(Base.metadata, "after_create")
+def create_change_triggers(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        statements = POSTGRES_SYNC_DDL
+    elif connection.dialect.name == "sqlite":
+        statements = SQLITE_SYNC_DDL
+    else:
+        return
+
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+# every change below this transaction id is committed or rolled back, so a
+# sync never skips one committing late (None on sqlite, writers take turns)
+async def settled_txid(db):
+    if db.bind.dialect.name != "postgresql":
+        return None
+    return await db.scalar(
+        select(func.txid_snapshot_xmin(func.txid_current_snapshot()))
+    )
+
+
+async def prune_changes():
+    async with SessionLocal() as db:
+        before = utc_now() - timedelta(days=SYNC_RETENTION_DAYS)
+        await db.execute(delete(Change).where(Change.changed_at < before))
+        await db.commit()
+
+
+# run by the app lifespan, every worker prunes the shared log; waits first so
+# starting a worker does not hit the database
+async def prune_changes_periodically():
+    while True:
+        await asyncio.sleep(SYNC_PRUNE_INTERVAL)
+        try:
+            await prune_changes()
+        except Exception as e:
+            print("ERREUR prune_changes :", e)
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from decouple import config
+
+from src.services.metrics import register_metrics
+
+
+@dataclass(frozen=True)
+class JWTSettings:
+    secret_key: str
+    algorithm: str
+
+
+# jwt key material, read once when the app starts
+jwt_settings = JWTSettings(
+    secret_key=config("SECRETE_KEY"), algorithm=config("ALGORITHME")
+)
+
+TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", default=4096, cast=int)
+TOKEN_CACHE_TTL = config("TOKEN_CACHE_TTL", default=300, cast=int)
+
+
+# LRU of verified token claims, an entry never outlives the token "exp"
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token: str, claims: dict):
+        expires_at = time.time() + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        with self.lock:
+            self.entries[self.key(token)] = (claims, expires_at)
+            self.entries.move_to_end(self.key(token))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+register_metrics("token_cache", token_cache.stats)
@@ -0,0 +1,5 @@
+import os
+
+# read by the app modules on import: the tests only reach their own database,
+# no background job opens a connection to DATABASE_URL
+os.environ["SYNC_PRUNE_INTERVAL"] = "0"
@@ -1,5 +1,8 @@
+import asyncio
+
 import pytest
 from decouple import config
+from fastapi import HTTPException
 from jose import jwt
 from passlib.context import CryptContext
 from sqlalchemy import text
@@ -12,7 +15,10 @@ from src.routes.auth.auth import (
     getAccessToken,
     getRefreshToken,
 )
+from src.services.cache import response_cache
+from src.services.passwords import PasswordHasher
 from src.services.services import get_db
+from src.services.tokens import TokenCache, token_cache
 from src.tests.utilities import *
 
 app.dependency_overrides[get_db] = getTest_db
@@ -24,6 +30,8 @@ def test_user():
     with engine.connect() as con:
         con.execute(text("DELETE FROM users"))
         con.commit()
+    # user ids are reused by sqlite, drop the lists cached for the previous one
+    asyncio.run(response_cache.clear())
 
     user = User(
         username="lyonnel",
@@ -41,9 +49,10 @@ def test_user():
         con.commit()
 
 
-def test_authenticate_fuction(test_user):
-    db = TestingSessionLocal()
-    result = authenticateUser(db, test_user.username, "lyonnel123")
+@pytest.mark.asyncio
+async def test_authenticate_fuction(test_user):
+    async with TestingAsyncSessionLocal() as db:
+        result = await authenticateUser(db, test_user.username, "lyonnel123")
 
     assert result is not None
     assert result.username == test_user.username  # type:ignore
@@ -98,6 +107,30 @@ async def test_getCurentUser(test_user):
     assert test_user.id == user.get("id")
 
 
+@pytest.mark.asyncio
+async def test_getCurentUser_caches_claims(test_user):
+    token = await getAccessToken(test_user.username, test_user.id, 30)
+    token_cache.clear()
+
+    misses = token_cache.misses
+    hits = token_cache.hits
+    assert get_current_user(token=token) == get_current_user(token=token)
+    assert token_cache.misses == misses + 1
+    assert token_cache.hits == hits + 1
+
+
+def test_token_cache_respects_expiry():
+    cache = TokenCache(maxsize=1, ttl=300)
+
+    cache.set("expired", {"id": 1, "exp": 0})
+    assert cache.get("expired") is None
+
+    cache.set("first", {"id": 1})
+    cache.set("second", {"id": 2})
+    assert cache.get("first") is None
+    assert cache.get("second") == {"id": 2}
+
+
 def test_create_user(test_user):
     data = {
         "username": "douglas",
@@ -108,6 +141,7 @@ def test_create_user(test_user):
     response = client.post("/auth/register-user/", json=data)
 
     assert response.status_code == status.HTTP_201_CREATED
+    assert "hashed_password" not in response.json()
     db = TestingSessionLocal()
     user = db.query(User).filter(User.username == data.get("username")).first()
     assert user is not None
@@ -125,4 +159,27 @@ async def test_login(test_user):
     response_data = response.json()
     assert response_data["user"]["username"] == test_user.username  # type:ignore
     assert response_data["user"]["email"] == test_user.email  # type:ignore
-    assert bcrypt_context.verify("lyonnel123", response_data["user"]["hashed_password"])  # type: ignore
+    assert "hashed_password" not in response_data["user"]
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_sheds_load():
+    hasher = PasswordHasher(bcrypt_context, workers=1, max_pending=1)
+
+    hashed = await hasher.hash("lyonnel123")
+    assert await hasher.verify("lyonnel123", hashed)
+
+    hasher.pending = hasher.max_pending
+    with pytest.raises(HTTPException) as error:
+        await hasher.hash("lyonnel123")
+    assert error.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    stats = hasher.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+
+
+def test_metrics_report_password_hasher():
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert "pending" in response.json()["password_hasher"]
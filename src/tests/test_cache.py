@@ -0,0 +1,163 @@
+import time
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+from fastapi import status
+
+from src.models import Task
+from src.services.cache import (
+    PROJECTS,
+    TASKS,
+    MemoryBackend,
+    RedisBackend,
+    ResponseCache,
+    response_cache,
+)
+from src.services.services import get_db
+from src.tests.test_auth import test_user
+from src.tests.test_project import test_project
+from src.tests.test_task import test_task
+from src.tests.utilities import *
+
+app.dependency_overrides[get_db] = getTest_db
+
+
+# Test task lists are served from the cache until a write invalidates them
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_cached_task_list(test_task):
+    task, headers = test_task
+
+    first = client.get("/tasks/", headers=headers)
+    hits = response_cache.hits
+
+    # written behind the api's back, the cached list does not see it
+    db = TestingSessionLocal()
+    db.add(
+        Task(
+            title="hidden task",
+            description="not through the api",
+            user_id=task.user_id,
+            project_id=task.project_id,
+            deadline=datetime.now(timezone.utc),
+        )
+    )
+    db.commit()
+
+    second = client.get("/tasks/", headers=headers)
+    assert second.json() == first.json()
+    assert response_cache.hits == hits + 1
+
+    data = {
+        "title": "api task",
+        "description": "created through the api",
+        "project_id": task.project_id,
+        "deadline": datetime.now(timezone.utc).isoformat(),
+    }
+    response = client.post("/tasks/create-task", json=data, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    titles = [
+        item["title"] for item in client.get("/tasks/", headers=headers).json()["items"]
+    ]
+    assert titles == [task.title, "hidden task", "api task"]
+
+    # a comment changes the lists that include comments
+    client.get("/tasks/", params={"include": "comments"}, headers=headers)
+    client.post(
+        "/comment/creat-comment/",
+        json={"content": "cached?", "task_id": task.id},
+        headers=headers,
+    )
+    response = client.get("/tasks/", params={"include": "comments"}, headers=headers)
+    assert response.json()["items"][0]["comments"][0]["content"] == "cached?"
+
+
+# Test project lists are invalidated by project writes
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_cached_project_list(test_project):
+    project, headers = test_project
+
+    assert len(client.get("/project/", headers=headers).json()["items"]) == 1
+    client.post("/project/create/", json={"name": "second"}, headers=headers)
+    assert len(client.get("/project/", headers=headers).json()["items"]) == 2
+
+    client.delete(f"/project/delete-project/{project.id}", headers=headers)
+    assert len(client.get("/project/", headers=headers).json()["items"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_backend():
+    backend = MemoryBackend(maxsize=2, ttl=60)
+    cache = ResponseCache(backend)
+
+    body, version = await cache.get(1, TASKS, "a")
+    assert body is None
+    await cache.set(1, TASKS, "a", "[1]", version)
+    assert (await cache.get(1, TASKS, "a"))[0] == "[1]"
+
+    # a body built before an invalidation is not stored
+    _, version = await cache.get(1, TASKS, "b")
+    await cache.invalidate(1, TASKS)
+    await cache.set(1, TASKS, "b", "stale", version)
+    assert (await cache.get(1, TASKS, "b"))[0] is None
+    assert (await cache.get(1, TASKS, "a"))[0] is None
+
+    # size bound, least recently used first
+    for user_id in [1, 2, 3]:
+        _, version = await cache.get(user_id, PROJECTS, "p")
+        await cache.set(user_id, PROJECTS, "p", "[]", version)
+    assert backend.size() == 2
+    assert (await cache.get(1, PROJECTS, "p"))[0] is None
+
+    backend.ttl = 0
+    _, version = await cache.get(4, PROJECTS, "p")
+    await cache.set(4, PROJECTS, "p", "[]", version)
+    time.sleep(0.01)
+    assert (await cache.get(4, PROJECTS, "p"))[0] is None
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 10
+
+
+@pytest.mark.asyncio
+async def test_redis_backend():
+    client = fakeredis.FakeAsyncRedis()
+    cache = ResponseCache(RedisBackend(client, ttl=60, scope_size=2))
+
+    _, version = await cache.get(1, TASKS, "a")
+    await cache.set(1, TASKS, "a", "[1]", version)
+    assert (await cache.get(1, TASKS, "a"))[0] == b"[1]"
+    assert 0 < await client.ttl("response_cache:1:tasks") <= 60
+
+    # invalidation is per user and scope
+    _, version = await cache.get(2, TASKS, "a")
+    await cache.set(2, TASKS, "a", "[2]", version)
+    _, version = await cache.get(1, TASKS, "b")
+    await cache.invalidate(1, TASKS)
+    await cache.set(1, TASKS, "b", "stale", version)
+    assert (await cache.get(1, TASKS, "a"))[0] is None
+    assert (await cache.get(1, TASKS, "b"))[0] is None
+    assert (await cache.get(2, TASKS, "a"))[0] == b"[2]"
+
+    # a scope over its size starts over
+    for key in ["a", "b", "c"]:
+        _, version = await cache.get(3, PROJECTS, key)
+        await cache.set(3, PROJECTS, key, "[]", version)
+    assert await client.exists("response_cache:3:projects") == 0
+
+    await cache.clear()
+    assert await client.keys("response_cache:*") == []
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_are_misses():
+    client = fakeredis.FakeAsyncRedis(connected=False)
+    cache = ResponseCache(RedisBackend(client, ttl=60, scope_size=2))
+
+    assert await cache.get(1, TASKS, "a") == (None, None)
+    await cache.invalidate(1, TASKS)
+    assert cache.stats()["errors"] == 2
@@ -2,7 +2,7 @@ import pytest
 from fastapi import status
 from sqlalchemy import text
 
-from src.models import Comment
+from src.models import Comment, Task
 from src.services.services import get_db
 from src.tests.test_auth import test_user
 from src.tests.test_project import test_project
@@ -50,7 +50,7 @@ async def test_get_all_task_comment(test_comment):
 
     assert response is not None
     assert response.status_code == status.HTTP_200_OK
-    data = response.json()
+    data = response.json()["items"]
     assert data[0].get("content") == "Test comment content"
 
 
@@ -77,6 +77,18 @@ async def test_create_comment(test_comment):
     assert value.content == data.get("content")  # type: ignore
 
 
+# Create a comment on a task that does not exist
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_create_comment_unknown_task(test_comment):
+    _, headers = test_comment
+
+    data = {"content": "lost comment", "task_id": 999999}
+    response = client.post("/comment/creat-comment/", json=data, headers=headers)
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 # Edit comment
 @pytest.mark.asyncio
 @pytest.mark.integration
@@ -100,3 +112,41 @@ async def test_edit_comment(test_comment):
     db = TestingSessionLocal()
     value = db.query(Comment).filter(Comment.id == result["id"]).first()
     assert value.content == data.get("content")  # type: ignore
+
+
+# Edit a comment owned by another user
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_edit_comment_not_owner(test_comment):
+    comment, headers = test_comment
+
+    db = TestingSessionLocal()
+    db.execute(
+        text("UPDATE comments SET user_id = NULL WHERE id = :id"),
+        {"id": comment.id},
+    )
+    db.commit()
+
+    response = client.put(
+        f"/comment/edit-comment/{comment.id}", json={"content": "x"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Delete the project of a commented task
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_delete_project_cascades(test_comment):
+    comment, headers = test_comment
+
+    db = TestingSessionLocal()
+    task = db.query(Task).filter(Task.id == comment.task_id).first()
+
+    response = client.delete(
+        f"/project/delete-project/{task.project_id}", headers=headers  # type: ignore
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    db = TestingSessionLocal()
+    assert db.query(Task).filter(Task.id == comment.task_id).first() is None
+    assert db.query(Comment).filter(Comment.id == comment.id).first() is None
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import NullPool, exc
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.database as database
+from src.database import (
+    TimedQueuePool,
+    get_async_url,
+    pool_limits,
+    pool_metrics,
+    worker_connections,
+)
+from src.services.metrics import collect_metrics
+
+
+# Test the connection budget is split across the workers, one at least
+def test_worker_pool_limits():
+    assert worker_connections(15, 1) == 15
+    assert worker_connections(15, 4) == 3
+    assert worker_connections(2, 4) == 1
+
+    assert pool_limits(15) == (10, 5)
+    assert pool_limits(3) == (2, 1)
+    assert pool_limits(1) == (1, 0)
+    # a configured pool size leaves the rest of the share as overflow
+    assert pool_limits(15, 5) == (5, 10)
+    assert pool_limits(3, 5) == (5, 0)
+
+
+# Test pgbouncer mode leaves pooling to pgbouncer, without prepared statements
+def test_pgbouncer_engine_options(monkeypatch):
+    monkeypatch.setattr(database, "DB_PGBOUNCER", True)
+    url = get_async_url("postgresql://user@pgbouncer:6432/taskboard")
+
+    options = database.get_engine_options(url)
+
+    assert options["poolclass"] is NullPool
+    assert options["connect_args"]["statement_cache_size"] == 0
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+    name = options["connect_args"]["prepared_statement_name_func"]
+    assert name() != name()
+
+    monkeypatch.setattr(database, "DB_PGBOUNCER", False)
+    options = database.get_engine_options(url)
+    assert options["poolclass"] is TimedQueuePool
+    assert options["pool_size"] == database.DB_POOL_SIZE
+
+
+# Test a checkout waiting past the pool timeout is counted
+@pytest.mark.asyncio
+async def test_pool_timeout_metric(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    checkouts, timeouts = pool_metrics.checkouts, pool_metrics.timeouts
+    try:
+        async with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+    finally:
+        await engine.dispose()
+
+    assert pool_metrics.checkouts == checkouts + 2
+    assert pool_metrics.timeouts == timeouts + 1
+    assert "db_pool" in collect_metrics()
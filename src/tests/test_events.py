@@ -0,0 +1,111 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src.services.events import BoardEvents, MemoryBackend
+from src.services.services import get_db
+from src.tests.test_auth import test_user
+from src.tests.test_project import test_project
+from src.tests.utilities import *
+
+app.dependency_overrides[get_db] = getTest_db
+
+
+# Test the board socket receives the task and comment changes of its project
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_project_events(test_project):
+    project, headers = test_project
+    token = headers["Authorization"].removeprefix("Bearer ")
+
+    # one event loop for the socket and the requests publishing to it
+    with TestClient(app) as events_client:
+        with events_client.websocket_connect(
+            f"/ws/project/{project.id}?token={token}"
+        ) as websocket:
+            data = {
+                "title": "live task",
+                "description": "pushed to the board",
+                "project_id": project.id,
+                "deadline": datetime.now(timezone.utc).isoformat(),
+            }
+            response = events_client.post(
+                "/tasks/create-task", json=data, headers=headers
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+            task = response.json()
+
+            event = websocket.receive_json()
+            assert event["type"] == "task.created"
+            assert event["project_id"] == project.id
+            assert event["data"] == task
+
+            response = events_client.post(
+                "/comment/creat-comment/",
+                json={"content": "live comment", "task_id": task["id"]},
+                headers=headers,
+            )
+            event = websocket.receive_json()
+            assert event["type"] == "comment.created"
+            assert event["data"] == response.json()
+
+            events_client.put(
+                f"/tasks/update-task/{task['id']}",
+                json={"status": "done"},
+                headers=headers,
+            )
+            event = websocket.receive_json()
+            assert event["type"] == "task.updated"
+            assert event["data"]["status"] == "done"
+
+            events_client.delete(f"/tasks/delete-task/{task['id']}", headers=headers)
+            event = websocket.receive_json()
+            assert event == {
+                "type": "task.deleted",
+                "project_id": project.id,
+                "data": {"id": task["id"]},
+            }
+
+
+# Test a socket without a valid token or on another user's project is refused
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_project_events_refused(test_project):
+    project, headers = test_project
+
+    for url, socket_headers in [
+        (f"/ws/project/{project.id}", {}),
+        (f"/ws/project/{project.id}?token=invalid", {}),
+        (f"/ws/project/{project.id + 1}", headers),
+    ]:
+        with pytest.raises(WebSocketDisconnect) as error:
+            with client.websocket_connect(url, headers=socket_headers):
+                pass
+        assert error.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+# Test a socket that falls behind is dropped instead of buffering forever
+@pytest.mark.asyncio
+async def test_board_events_overflow():
+    events = BoardEvents(MemoryBackend(), queue_size=1)
+    subscription = events.subscribe(1)
+    other = events.subscribe(2)
+
+    await events.publish(1, "task.deleted", {"id": 1})
+    await events.publish(1, "task.deleted", {"id": 2})
+    await events.publish(2, "project.deleted")
+
+    assert subscription.overflowed
+    assert subscription.queue.get_nowait() == (
+        '{"type":"task.deleted","project_id":1,"data":{"id":1}}'
+    )
+    assert other.queue.get_nowait() == '{"type":"project.deleted","project_id":2}'
+    assert events.stats()["delivered"] == 2
+    assert events.stats()["dropped"] == 1
+
+    events.unsubscribe(subscription)
+    events.unsubscribe(other)
+    assert events.stats()["sockets"] == 0
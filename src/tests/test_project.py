@@ -1,8 +1,11 @@
+import io
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from fastapi import HTTPException, status
-from sqlalchemy import text
+from sqlalchemy import event, text
 
-from src.models import Project
+from src.models import Comment, Project, Task
 from src.services.services import get_db
 from src.tests.test_auth import test_user
 from src.tests.utilities import *
@@ -59,14 +62,17 @@ async def test_get_projects(test_project):
 
     assert response is not None
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [
-        {
-            "id": project.id,
-            "name": "Developpement web",
-            "description": "Projet de developpement web",
-            "user_id": project.user_id,
-        }
-    ]
+    assert response.json() == {
+        "items": [
+            {
+                "id": project.id,
+                "name": "Developpement web",
+                "description": "Projet de developpement web",
+                "user_id": project.user_id,
+            }
+        ],
+        "next_cursor": None,
+    }
 
 
 # Test get unique project
@@ -166,7 +172,7 @@ async def test_get_user_projects(test_project):
     project, headers = test_project
 
     response = client.get("/project/user/", headers=headers)
-    all_data = response.json()
+    all_data = response.json()["items"]
     print(response)
     assert response is not None
     assert response.status_code == status.HTTP_200_OK
@@ -183,4 +189,160 @@ async def test_get_project_tasks(test_project):
     deleted_data = response.json()
     assert response is not None
     assert response.status_code == status.HTTP_200_OK
-    assert isinstance(deleted_data, list)
+    assert isinstance(deleted_data["items"], list)
+    assert deleted_data["next_cursor"] is None
+
+
+# Test export project tasks as csv
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_export_project_tasks(test_project):
+    project, headers = test_project
+    response = client.get(
+        f"/project/{project.id}/export", params={"format": "csv"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0].startswith("id,title,description")
+
+    response = client.get(f"/project/{project.id + 1}/export", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Test import tasks from a csv file
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_import_project_tasks(test_project):
+    project, headers = test_project
+    content = (
+        "title,description,status,priority,deadline\n"
+        "Imported task,From csv,done,high,2030-01-01T00:00:00\n"
+        "Broken task,From csv,unknown,,2030-01-01T00:00:00\n"
+        "Wide task,From csv,done,high,2030-01-01T00:00:00,extra\n"
+    )
+    file = {"file": ("tasks.csv", io.BytesIO(content.encode()), "text/csv")}
+
+    response = client.post(f"/project/{project.id}/import", files=file, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    result = response.json()
+    assert result["imported"] == 1
+    assert result["failed"] == 2
+    assert result["errors"][0]["line"] == 3
+    assert result["errors"][1] == {
+        "line": 4,
+        "error": "Too many columns: 6 cells for 5 headers",
+    }
+
+    db = TestingSessionLocal()
+    task = db.query(Task).filter(Task.project_id == project.id).first()
+    assert task.title == "Imported task"  # type: ignore
+    assert task.status == "done"  # type: ignore
+
+
+# Test project dashboard counts
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_get_project_stats(test_project):
+    project, headers = test_project
+
+    now = datetime.now(timezone.utc)
+    db = TestingSessionLocal()
+    for task_status, priority, days in [
+        ("todo", "high", -1),
+        ("done", "low", -2),
+        ("in_progress", "low", 3),
+        ("todo", "medium", 1),
+    ]:
+        db.add(
+            Task(
+                title=f"{task_status} task",
+                description="stats task",
+                user_id=project.user_id,
+                project_id=project.id,
+                deadline=now + timedelta(days=days),
+                status=task_status,
+                priority=priority,
+            )
+        )
+    db.commit()
+
+    response = client.get(f"/project/{project.id}/stats", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()
+    assert stats["total"] == 4
+    assert stats["status"] == {"todo": 2, "in_progress": 1, "done": 1}
+    assert stats["priority"] == {"low": 2, "medium": 1, "high": 1}
+    assert stats["overdue"] == 1
+    assert stats["next_deadline"].startswith(
+        (now + timedelta(days=1)).replace(tzinfo=None).isoformat()[:16]
+    )
+
+    response = client.get(f"/project/{project.id + 1}/stats", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Test load a whole board with its tasks and comments
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_get_project_include_tasks_comments(test_project):
+    project, headers = test_project
+
+    db = TestingSessionLocal()
+    tasks = [
+        Task(
+            title=f"board task {index}",
+            description="board",
+            user_id=project.user_id,
+            project_id=project.id,
+            deadline=datetime.now(timezone.utc),
+        )
+        for index in range(3)
+    ]
+    db.add_all(tasks)
+    db.flush()
+    db.add_all(
+        [
+            Comment(content=f"comment {task.id}", task_id=task.id, user_id=task.user_id)
+            for task in tasks
+        ]
+    )
+    db.commit()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get(
+            f"/project/{project.id}",
+            params={"include": "tasks,comments"},
+            headers=headers,
+        )
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == status.HTTP_200_OK
+    # the ETag aggregates, then project, tasks and comments
+    assert len(statements) == 4
+    board = response.json()
+    assert len(board["tasks"]) == 3
+    for task in board["tasks"]:
+        assert [comment["content"] for comment in task["comments"]] == [
+            f"comment {task['id']}"
+        ]
+
+    # without include the shape is unchanged
+    response = client.get(f"/project/{project.id}", headers=headers)
+    assert "tasks" not in response.json()
+
+    response = client.get(
+        f"/project/{project.id}/tasks", params={"include": "comments"}, headers=headers
+    )
+    assert all(len(task["comments"]) == 1 for task in response.json()["items"])
+
+    response = client.get(
+        f"/project/{project.id}", params={"include": "owner"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
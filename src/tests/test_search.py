@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import status
+
+from src.models import Task
+from src.services.services import get_db
+from src.tests.test_auth import test_user
+from src.tests.test_comment import test_comment
+from src.tests.test_project import test_project
+from src.tests.test_task import test_task
+from src.tests.utilities import *
+
+app.dependency_overrides[get_db] = getTest_db
+
+
+# Test search tasks by their text and their comments
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_search_tasks(test_comment):
+    comment, headers = test_comment
+
+    db = TestingSessionLocal()
+    task = db.get(Task, comment.task_id)
+    for title, description in [
+        ("Deploy backend", "deploy the api then deploy the workers"),
+        ("Write release notes", "before the deploy"),
+    ]:
+        db.add(
+            Task(
+                title=title,
+                description=description,
+                user_id=task.user_id,
+                project_id=task.project_id,
+                deadline=datetime.now(timezone.utc),
+            )
+        )
+    db.commit()
+
+    response = client.get("/search", params={"q": "deploy"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()["items"]
+    assert [item["title"] for item in items] == [
+        "Deploy backend",
+        "Write release notes",
+    ]
+    assert items[0]["rank"] >= items[1]["rank"]
+
+    # comments match their task, stemming included
+    response = client.get("/search", params={"q": "comments"}, headers=headers)
+    assert [item["id"] for item in response.json()["items"]] == [task.id]
+
+    # ranked results page through the cursor
+    titles = []
+    params = {"q": "deploy", "limit": 1}
+    while True:
+        page = client.get("/search", params=params, headers=headers).json()
+        titles += [item["title"] for item in page["items"]]
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert titles == ["Deploy backend", "Write release notes"]
+
+    response = client.get("/search", params={"q": "?!"}, headers=headers)
+    assert response.json() == {"items": [], "next_cursor": None}
+
+
+# Test the migrations and create_all build the same search structures
+def test_search_schema_matches_migrations(tmp_path, monkeypatch):
+    migrated, created = migrated_and_created(tmp_path, monkeypatch)
+
+    fts = sqlite_schema(migrated, "%_fts%")
+    assert fts == sqlite_schema(created, "%_fts%")
+    assert {"tasks_fts", "comments_fts", "tasks_fts_update"} <= {
+        row.name for row in fts
+    }
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+
+import src.routes.sync.sync as sync
+import src.services.sync as sync_service
+from src.services.pagination import encode_cursor
+from src.services.services import get_db
+from src.tests.test_auth import test_user
+from src.tests.test_project import test_project
+from src.tests.utilities import *
+
+app.dependency_overrides[get_db] = getTest_db
+
+
+# Test a sync only returns what changed since its token
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_sync_changes(test_project, monkeypatch):
+    project, headers = test_project
+
+    response = client.get("/sync", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["tasks"] == []
+    token = response.json()["token"]
+
+    data = {
+        "title": "synced task",
+        "description": "created while offline",
+        "project_id": project.id,
+        "deadline": datetime.now(timezone.utc).isoformat(),
+    }
+    task = client.post("/tasks/create-task", json=data, headers=headers).json()
+    task = client.put(
+        f"/tasks/update-task/{task['id']}", json={"status": "done"}, headers=headers
+    ).json()
+    comment = client.post(
+        "/comment/creat-comment/",
+        json={"content": "synced comment", "task_id": task["id"]},
+        headers=headers,
+    ).json()
+
+    response = client.get("/sync", params={"since": token}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    changes = response.json()
+    # updated twice, sent once as it is now
+    assert changes["tasks"] == [task]
+    assert changes["comments"] == [comment]
+    assert changes["projects"] == []
+    assert changes["has_more"] is False
+
+    # nothing changed since
+    token = changes["token"]
+    response = client.get("/sync", params={"since": token}, headers=headers)
+    assert response.json()["tasks"] == []
+    assert response.json()["comments"] == []
+
+    client.delete(f"/tasks/delete-task/{task['id']}", headers=headers)
+    client.put(
+        f"/project/edit-project/{project.id}",
+        json={"name": "renamed", "description": "d"},
+        headers=headers,
+    )
+
+    # one change per response, the client asks again while has_more
+    monkeypatch.setattr(sync, "SYNC_MAX_CHANGES", 1)
+    response = client.get("/sync", params={"since": token}, headers=headers)
+    changes = response.json()
+    assert changes["deleted"]["tasks"] == [task["id"]]
+    assert changes["has_more"] is True
+
+    response = client.get("/sync", params={"since": changes["token"]}, headers=headers)
+    changes = response.json()
+    assert [row["name"] for row in changes["projects"]] == ["renamed"]
+    assert changes["has_more"] is False
+
+
+# Test a malformed token is refused and an expired one asks for a reload
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_sync_invalid_token(test_project):
+    _, headers = test_project
+
+    response = client.get("/sync", params={"since": "not-a-token"}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    issued_at = datetime.now() - timedelta(days=sync.SYNC_RETENTION_DAYS + 1)
+    token = encode_cursor([0, 0, issued_at])
+    response = client.get("/sync", params={"since": token}, headers=headers)
+    assert response.status_code == status.HTTP_410_GONE
+
+
+# Test the pruner waits an interval before its first delete
+@pytest.mark.asyncio
+async def test_prune_waits_before_first_run(monkeypatch):
+    calls = []
+
+    async def prune_changes():
+        calls.append("prune")
+
+    async def sleep(seconds):
+        calls.append("sleep")
+        if len(calls) > 2:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(sync_service, "prune_changes", prune_changes)
+    monkeypatch.setattr(sync_service.asyncio, "sleep", sleep)
+    with pytest.raises(asyncio.CancelledError):
+        await sync_service.prune_changes_periodically()
+    assert calls == ["sleep", "prune", "sleep"]
+
+
+# Test the migrations and create_all build the same change log triggers
+def test_change_triggers_match_migrations(tmp_path, monkeypatch):
+    migrated, created = migrated_and_created(tmp_path, monkeypatch)
+
+    triggers = sqlite_schema(migrated, "%_changes_%")
+    assert triggers == sqlite_schema(created, "%_changes_%")
+    assert len([row for row in triggers if row.type == "trigger"]) == 9
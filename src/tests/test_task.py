@@ -1,4 +1,6 @@
-from datetime import datetime, timezone
+import base64
+import json
+from datetime import datetime, timedelta, timezone
 
 import pytest
 from fastapi import status
@@ -50,8 +52,8 @@ async def test_get_tasks(test_task):
     task, headers = test_task
     response = client.get("/tasks/", headers=headers)
     assert response.status_code == status.HTTP_200_OK
-    assert response.json()[0].get("title") == task.title
-    assert response.json()[0].get("description") == task.description
+    assert response.json()["items"][0].get("title") == task.title
+    assert response.json()["items"][0].get("description") == task.description
 
 
 # test create task
@@ -128,7 +130,264 @@ async def test_get_user_tasks(test_task):
     response = client.get(f"/tasks/user/{task.user_id}", headers=headers)
     assert response is not None
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.json()) > 0
-    assert response.json()[0].get("id") == task.id
-    assert response.json()[0].get("user_id") == task.user_id
-    assert response.json()[0].get("project_id") == task.project_id
+    tasks = response.json()["items"]
+    assert len(tasks) > 0
+    assert tasks[0].get("id") == task.id
+    assert tasks[0].get("user_id") == task.user_id
+    assert tasks[0].get("project_id") == task.project_id
+
+
+# Test paginate tasks with a cursor
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_get_tasks_pagination(test_task):
+    task, headers = test_task
+
+    db = TestingSessionLocal()
+    for priority in ["high", "low"]:
+        db.add(
+            Task(
+                title=f"{priority} task",
+                description="paginated task",
+                user_id=task.user_id,
+                project_id=task.project_id,
+                deadline=datetime.now(timezone.utc),
+                status="todo",
+                priority=priority,
+            )
+        )
+    db.commit()
+
+    titles = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "order_by": "priority"}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get("/tasks/", params=params, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert len(page["items"]) <= 2
+        titles += [item["title"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert titles == ["low task", task.title, "high task"]
+
+
+# Test filter and sort the task list on the server
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_get_tasks_filters(test_task):
+    task, headers = test_task
+
+    now = datetime.now(timezone.utc)
+    db = TestingSessionLocal()
+    for title, task_status, priority, days in [
+        ("late task", "todo", "high", -2),
+        ("done task", "done", "low", -3),
+        ("future task", "todo", "low", 5),
+    ]:
+        db.add(
+            Task(
+                title=title,
+                description="filtered task",
+                user_id=task.user_id,
+                project_id=task.project_id,
+                deadline=now + timedelta(days=days),
+                status=task_status,
+                priority=priority,
+            )
+        )
+    db.commit()
+
+    def titles(params):
+        response = client.get("/tasks/", params=params, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return [item["title"] for item in response.json()["items"]]
+
+    assert titles({"status": ["todo", "done"]}) == [
+        "late task",
+        "done task",
+        "future task",
+    ]
+    assert titles({"priority": "low", "status": "todo"}) == ["future task"]
+    # the fixture task is due "now", so it is already overdue
+    assert titles({"overdue": True}) == [task.title, "late task"]
+    assert titles({"deadline_from": (now + timedelta(days=1)).isoformat()}) == [
+        "future task"
+    ]
+
+    # descending order keeps paging through the cursor
+    sorted_titles = []
+    params = {"limit": 2, "order_by": "priority", "direction": "desc"}
+    while True:
+        response = client.get("/tasks/", params=params, headers=headers)
+        page = response.json()
+        sorted_titles += [item["title"] for item in page["items"]]
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert sorted_titles == [
+        "late task",
+        task.title,
+        "future task",
+        "done task",
+    ]
+
+    project_response = client.get(
+        f"/project/{task.project_id}/tasks",
+        params={"overdue": True},
+        headers=headers,
+    )
+    assert [item["title"] for item in project_response.json()["items"]] == [
+        task.title,
+        "late task",
+    ]
+
+
+# Test reject an invalid cursor
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_get_tasks_invalid_cursor(test_task):
+    task, headers = test_task
+    response = client.get("/tasks/", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# Test reject a well-formed cursor holding values no sort key can have
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_get_tasks_crafted_cursor(test_task):
+    task, headers = test_task
+    crafted = [
+        [[1]],
+        [{"a": 1}],
+        [True],
+        [{"datetime": "yesterday"}],
+        [{"datetime": 1}],
+        [{"datetime": "2030-01-01T00:00:00", "x": 1}],
+        [1, [2]],
+    ]
+    for values in crafted:
+        raw = json.dumps(values).encode()
+        cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        response = client.get("/tasks/", params={"cursor": cursor}, headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, values
+        assert response.json() == {"detail": "Invalid cursor"}
+
+    cursor = base64.urlsafe_b64encode(b"[" * 5000).decode()
+    response = client.get("/tasks/", params={"cursor": cursor}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# Test update and delete an unknown task
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_update_delete_task_not_found(test_task):
+    task, headers = test_task
+    response = client.put(
+        f"/tasks/update-task/{task.id + 1}", json={"title": "x"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = client.delete(f"/tasks/delete-task/{task.id + 1}", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Test bulk create and bulk update tasks
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_bulk_create_update_tasks(test_task):
+    task, headers = test_task
+    deadline = task.deadline.isoformat()
+
+    data = [
+        {"title": "bulk 1", "description": "d", "deadline": deadline},
+        {"title": "bulk 2", "description": "d", "deadline": deadline},
+    ]
+    data[0]["project_id"] = task.project_id
+    data[1]["project_id"] = task.project_id + 1
+    response = client.post("/tasks/bulk", json=data, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.json()
+    assert results[0]["ok"] and results[0]["task"]["title"] == "bulk 1"
+    assert not results[1]["ok"] and results[1]["error"] == "Project not found"
+
+    data = [
+        {"id": task.id, "status": "done"},
+        {"id": results[0]["task"]["id"], "title": "bulk renamed"},
+        {"id": task.id + 100, "title": "missing"},
+    ]
+    response = client.patch("/tasks/bulk", json=data, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert results[0]["task"]["status"] == "done"
+    assert results[0]["task"]["title"] == task.title
+    assert results[1]["task"]["title"] == "bulk renamed"
+    assert not results[2]["ok"]
+
+
+# Test reject bulk requests above the cap
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_bulk_update_tasks_cap(test_task, monkeypatch):
+    task, headers = test_task
+    monkeypatch.setattr("src.routes.tasks.task.TASK_BULK_MAX_ITEMS", 1)
+    data = [{"id": task.id}, {"id": task.id}]
+    response = client.patch("/tasks/bulk", json=data, headers=headers)
+    assert response.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+
+
+# Test export tasks as ndjson
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_export_tasks(test_task):
+    task, headers = test_task
+    response = client.get("/tasks/export", params={"format": "ndjson"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [task.id]
+    assert lines[0]["title"] == task.title
+    assert lines[0]["comments"] == []
+
+
+# Test conditional GETs on task lists
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_task_list_etag(test_task):
+    task, headers = test_task
+
+    etags = {}
+    for url in ["/tasks/", f"/tasks/user/{task.user_id}"]:
+        response = client.get(url, headers=headers)
+        etag = etags[url] = response.headers["ETag"]
+
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+        # other query parameters are another list
+        response = client.get(
+            url, params={"limit": 1}, headers={**headers, "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    response = client.put(
+        f"/tasks/update-task/{task.id}", json={"title": "renamed"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    db = TestingSessionLocal()
+    updated = db.get(Task, task.id)
+    assert updated.version == 2
+    assert updated.updated_at > task.updated_at
+
+    for url, etag in etags.items():
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        assert response.json()["items"][0]["title"] == "renamed"
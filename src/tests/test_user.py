@@ -1,11 +1,15 @@
+import hashlib
 import io
 from pathlib import Path as Pathlib
 
+import httpx
 import pytest
 from fastapi import HTTPException, status
+from PIL import Image
 
 from src.models import User
 from src.routes.auth.auth import get_db
+from src.services import storage
 from src.tests.test_auth import test_user
 from src.tests.utilities import *
 
@@ -62,3 +66,148 @@ async def test_edit_user_profile_with_image(test_auth_user, tmp_path):
     saved_path = Pathlib(resp_json["user"]["profile_image"])
     assert saved_path.exists()
     assert saved_path.read_bytes() == file_content
+
+
+# Test an image over the size cap is refused and leaves no file behind
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_edit_user_profile_image_too_large(test_auth_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "MEDIA_ROOT", tmp_path)
+    monkeypatch.setattr(storage, "PROFILE_IMAGE_MAX_BYTES", 10)
+    _, headers = test_auth_user
+
+    data = {"username": "updateduser", "email": "updated@example.com"}
+    file = {"profile_image": ("big.png", io.BytesIO(b"x" * 11), "image/png")}
+
+    response = client.put("/user/edit/", data=data, files=file, headers=headers)
+
+    assert response.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+    assert list(tmp_path.rglob("*")) == []
+
+    # right at the cap is accepted
+    file = {"profile_image": ("big.png", io.BytesIO(b"x" * 10), "image/png")}
+    response = client.put("/user/edit/", data=data, files=file, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+# Test an oversized body is refused while received, never read to the end
+@pytest.mark.asyncio
+async def test_edit_user_profile_body_too_large(monkeypatch):
+    monkeypatch.setattr(storage, "PROFILE_IMAGE_MAX_BYTES", 1024)
+    monkeypatch.setattr(storage, "UPLOAD_FORM_OVERHEAD", 1024)
+    sent = []
+
+    async def body():
+        yield b"--x\r\nContent-Disposition: form-data; name=profile_image; "
+        yield b'filename="big.png"\r\nContent-Type: image/png\r\n\r\n'
+        for _ in range(100):
+            sent.append(1024)
+            yield b"x" * 1024
+
+    headers = {"Content-Type": "multipart/form-data; boundary=x"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+        # announced too large: refused before reading any of it
+        response = await api.put(
+            "/user/edit/",
+            content=body(),
+            headers={**headers, "Content-Length": str(100 * 1024)},
+        )
+        assert response.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+        assert sent == []
+
+        # streamed without a length: stopped just past the cap
+        response = await api.put("/user/edit/", content=body(), headers=headers)
+        assert response.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+        assert sum(sent) <= 3 * 1024
+
+
+# Test the cap also holds while copying, whatever size the upload announced
+def test_write_hashed_file_stops_at_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_SIZE", 4)
+    directory = tmp_path / "profiles"
+
+    path = storage.write_hashed_file(io.BytesIO(b"x" * 10), directory, ".png", 10)
+    assert path.name == hashlib.sha256(b"x" * 10).hexdigest() + ".png"
+    assert path.read_bytes() == b"x" * 10
+
+    with pytest.raises(HTTPException) as error:
+        storage.write_hashed_file(io.BytesIO(b"y" * 11), directory, ".png", 10)
+    assert error.value.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+    # the stored file is untouched and no temp file is left
+    assert list(directory.iterdir()) == [path]
+
+
+# Test an uploaded image gets its thumbnails and the avatar serves the right one
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_profile_image_thumbnails(test_auth_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "MEDIA_ROOT", tmp_path)
+    testing_user, headers = test_auth_user
+
+    image = io.BytesIO()
+    Image.new("RGBA", (300, 200), (255, 0, 0, 128)).save(image, "PNG")
+    data = {"username": testing_user.username, "email": testing_user.email}
+    file = {"profile_image": ("avatar.png", io.BytesIO(image.getvalue()), "image/png")}
+
+    response = client.put("/user/edit/", data=data, files=file, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["user"]["profile_variants"] is None
+
+    # the background job ran once the response was sent
+    db = TestingSessionLocal()
+    user = db.query(User).filter_by(id=testing_user.id).first()
+    variants = user.profile_variants
+    db.close()
+    assert sorted(variants, key=int) == ["32", "64", "128", "256"]
+    with Image.open(variants["64"]["webp"]) as thumbnail:
+        assert thumbnail.size == (64, 64)
+        assert thumbnail.format == "WEBP"
+
+    url = f"/user/{testing_user.id}/avatar"
+    response = client.get(
+        url, params={"size": 40}, headers={**headers, "Accept": "image/webp,*/*"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "image/webp"
+    assert response.content == Pathlib(variants["64"]["webp"]).read_bytes()
+
+    response = client.get(url, params={"size": 1000}, headers=headers)
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content == Pathlib(variants["256"]["jpeg"]).read_bytes()
+
+
+# Test stored files are served from immutable content-hash urls
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_media_immutable_urls(test_auth_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "MEDIA_ROOT", tmp_path)
+    testing_user, headers = test_auth_user
+
+    data = {"username": testing_user.username, "email": testing_user.email}
+    file = {
+        "profile_image": ("avatar.png", io.BytesIO(b"not really a png"), "image/png")
+    }
+    response = client.put("/user/edit/", data=data, files=file, headers=headers)
+    user = response.json()["user"]
+    url = user["profile_image_url"]
+    assert Pathlib(user["profile_image"]).name == Pathlib(url).name
+    assert url.endswith(".png")
+
+    # public, no token needed
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b"not really a png"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag = response.headers["etag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(url, headers={"Range": "bytes=0-3"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == b"not "
+
+    (tmp_path.parent / "secret.txt").write_text("secret")
+    for path in ["/media/../secret.txt", "/media/%2E%2E/secret.txt", "/media/nope.png"]:
+        assert client.get(path).status_code == status.HTTP_404_NOT_FOUND
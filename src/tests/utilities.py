@@ -1,15 +1,24 @@
+from pathlib import Path as Pathlib
 from typing import Annotated
 
 from fastapi import Depends
 from fastapi.testclient import TestClient
-from sqlalchemy import StaticPool
+from sqlalchemy import NullPool, StaticPool, text
 from sqlalchemy.engine import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import sessionmaker
 
-from src.database import Base
+from alembic import command
+from alembic.config import Config
+from src.database import Base, enable_sqlite_foreign_keys
 from src.main import app
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./testdb.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./testdb.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -17,19 +26,58 @@ engine = create_engine(
     poolclass=StaticPool,
 )
 
+# the app runs on its own event loop for every TestClient request
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+
+enable_sqlite_foreign_keys(engine)
+enable_sqlite_foreign_keys(async_engine)
+
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, autocommit=False, expire_on_commit=False
+)
+
 Base.metadata.create_all(bind=engine)
 
 
-def getTest_db():
-    dbTest = TestingSessionLocal()
-    try:
+async def getTest_db():
+    async with TestingAsyncSessionLocal() as dbTest:
         yield dbTest
-    finally:
-        dbTest.close()
 
 
-dbtest_dependency = Annotated[Session, Depends(getTest_db)]
+dbtest_dependency = Annotated[AsyncSession, Depends(getTest_db)]
 
 client = TestClient(app)
+
+
+# triggers, tables and indexes of a sqlite database, to compare two schemas
+def sqlite_schema(url: str, like: str):
+    schema_engine = create_engine(url)
+    with schema_engine.connect() as con:
+        rows = con.execute(
+            text(
+                "SELECT type, name, sql FROM sqlite_master "
+                "WHERE name LIKE :like ORDER BY name"
+            ),
+            {"like": like},
+        ).all()
+    schema_engine.dispose()
+    return rows
+
+
+# a sqlite database built by the migrations, and one by create_all
+def migrated_and_created(tmp_path: Pathlib, monkeypatch):
+    migrated = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.setenv("DATABASE_URL", migrated)
+    alembic_config = Config()
+    alembic_config.set_main_option(
+        "script_location", str(Pathlib(__file__).parents[1] / "alembic")
+    )
+    command.upgrade(alembic_config, "head")
+
+    created = f"sqlite:///{tmp_path / 'created.db'}"
+    created_engine = create_engine(created)
+    Base.metadata.create_all(bind=created_engine)
+    created_engine.dispose()
+    return migrated, created